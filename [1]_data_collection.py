@@ -1,34 +1,21 @@
 from pathlib import Path
-import os, re, uuid, random, textwrap, datetime
+import os, re, uuid, random, textwrap, datetime, time
 from typing import Dict, List, Optional, Tuple
 
-import chromadb
-try:
-    from chromadb.config import Settings
-except Exception:
-    from chromadb import Settings
+import pandas as pd
+from kpi_engine import KpiIndex, build_kpi_table, format_kpi_context
+from report_index import index_report
+from telemetry import event, observe, share_metrics, span
+from retriever import COLLECTION_SLUGS, TOP_K, default_question, get_collection, retrieve, sector_for_industry
 
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+# prompt_build / first_token / generation / save histograms reach the app's /metrics endpoint
+share_metrics()
 
 # ---- Paths must match ingestion ----
 ROOT_DIR = Path.cwd()
 DATA_ROOT = ROOT_DIR / "data"
-PERSIST_ROOT = DATA_ROOT / "chroma_dbs"
-
-# Chroma collections (created during ingestion)
-COLLECTION_SLUGS = {
-    "education": "education",
-    "healthcare": "healthcare",
-    "private_sector": "private_sector",
-    "state": "state",
-}
-
-# Embedding model used at ingestion time (keep identical)
-EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-embedding_fn = SentenceTransformerEmbeddingFunction(model_name=EMBED_MODEL)
 
-# Retrieval params
-TOP_K = 6
+# Collections, embedding model and TOP_K live in retriever.py (shared with the app's prefetcher)
 MAX_CONTEXT_CHARS = 9000
 
 # Output dir for reports
@@ -41,23 +28,18 @@ private_sector  = " "
 healthcare_sector = " "
 state_sector = " "
 
+# Energy-intensity KPIs (kWh/m², YoY, peer percentiles) injected into the prompt
+KPI_INDEX = KpiIndex(build_kpi_table(
+    pd.read_excel(DATA_ROOT / "data_raw.xlsx", sheet_name="Clean_Data"),
+    pd.read_csv(DATA_ROOT / "buildings_cleaned.csv"),
+))
+
 # Optional: Swiss legal references/excerpts (paste your law text; left blank uses a generic disclaimer)
 swiss_law = ""
 
-def open_collection(slug: str):
-    persist_dir = PERSIST_ROOT / slug
-    if not persist_dir.exists():
-        raise FileNotFoundError(f"Chroma persist dir not found: {persist_dir}")
-    client = chromadb.Client(Settings(
-        anonymized_telemetry=False,
-        allow_reset=True,
-        is_persistent=True,
-        persist_directory=str(persist_dir),
-    ))
-    return client.get_collection(name=slug, embedding_function=embedding_fn)
-
-COLLECTIONS = {k: open_collection(v) for k, v in COLLECTION_SLUGS.items()}
-print("✅ Opened collections:", ", ".join([f"{k}→{v.name}" for k,v in COLLECTIONS.items()]))
+# Memory-mapped snapshot when exported (python vector_snapshot.py), Chroma client otherwise
+COLLECTIONS = {k: get_collection(k) for k in COLLECTION_SLUGS}
+print("✅ Opened collections:", ", ".join([f"{k}→{v.name} ({type(v).__name__})" for k,v in COLLECTIONS.items()]))
 
 
 import re
@@ -90,26 +72,7 @@ def parse_report_session_data_to_dict(file_path='report_session_data.txt'):
     return parsed_data
 
 def retrieve_topk(sector: str, question: str, sc_text: str, top_k: int = TOP_K):
-    if sector not in COLLECTIONS:
-        raise ValueError(f"Unknown sector '{sector}'. Choose among {list(COLLECTIONS.keys())}.")
-    col = COLLECTIONS[sector]
-
-    # Compose concise query (model context will include richer blocks)
-    q = f"{question}\nScénario: {sc_text}\nRéférences légales: {('fourni' if swiss_law.strip() else 'non fourni')}"
-    out = col.query(
-        query_texts=[q],
-        n_results=top_k,
-        include=["documents", "metadatas", "distances"],
-    )
-    docs = out.get("documents", [[]])[0]
-    metas = out.get("metadatas", [[]])[0]
-    dists = out.get("distances", [[]])[0]
-    return {
-        "sector": sector,
-        "scenario": sc_text,
-        "question": question,
-        "chunks": list(zip(docs, metas, dists)),
-    }
+    return retrieve(sector, question, sc_text, top_k=top_k, law_provided=bool(swiss_law.strip()))
 
 def truncate_chunks(chunks: List[Tuple[str, Dict, float]], max_chars: int = MAX_CONTEXT_CHARS):
     acc, total = [], 0
@@ -132,6 +95,9 @@ def truncate_chunks(chunks: List[Tuple[str, Dict, float]], max_chars: int = MAX_
         total += len(t)
     return acc
 
+# Bump whenever the prompt template below changes (recorded in the report index)
+PROMPT_VERSION = "2025-10-kpi"
+
 def build_markdown_prompt(sector: str, payload: Dict) -> Tuple[str, str, List[str]]:
     """
     Returns (system_msg, user_msg, sources_list)
@@ -139,6 +105,7 @@ def build_markdown_prompt(sector: str, payload: Dict) -> Tuple[str, str, List[st
     sc_text    = payload["scenario"]
     question   = payload["question"]
     chunks     = truncate_chunks(payload["chunks"], MAX_CONTEXT_CHARS)
+    kpi_block  = payload.get("kpi_context") or "(Aucun indicateur disponible)"
 
     # Build context block + citations we’ll also append after generation
     context_block = []
@@ -183,6 +150,7 @@ Si des lois précises ne sont pas fournies, rédige une synthèse prudente avec
 4) **Partie 2 — Données motivantes (scénario)**
 Présente des **données fictives mais plausibles**, alignées sur le scénario ("minimum", "moyen", "maximum").
 Les mettres dans une table et indiqué leurs valeurs et leurs unité (kWh, L, ...) Inclure indicateurs (pics, kWh/MWh, émissions CO₂).
+Si des indicateurs KPI réels sont fournis ci-dessous (kWh/m², évolution annuelle, position parmi les pairs), utilise-les en priorité à la place des données fictives.
 
 
 5) **Partie 3 — Informations spécifiques au domaine**
@@ -217,6 +185,9 @@ Le présent rapport est un appui opérationnel pour préparer votre établisseme
 Référence interne SIG : OST25-Resp-Hospitals-1.0"""
 }
 
+Indicateurs KPI (kWh/m² par vecteur et par année, comparaison aux pairs de la catégorie):
+{kpi_block}
+
 Extraits RAG:
 {context_block}
 """.strip()
@@ -238,21 +209,28 @@ def get_apertus_client():
 
 def call_apertus_stream(system_msg: str, user_msg: str) -> str:
     client = get_apertus_client()
-    stream = client.chat.completions.create(
-        model=APERTUS_MODEL,
-        messages=[{"role": "system", "content": system_msg},
-                  {"role": "user", "content": user_msg}],
-        temperature=0.2,
-        max_tokens=1200,
-        stream=True,
-    )
-    full = []
-    for chunk in stream:
-        delta = getattr(chunk.choices[0].delta, "content", None)
-        if delta:
-            print(delta, end="", flush=True)
-            full.append(delta)
-    print()
+    with span("generation", model=APERTUS_MODEL) as sp:
+        t0 = time.perf_counter()
+        stream = client.chat.completions.create(
+            model=APERTUS_MODEL,
+            messages=[{"role": "system", "content": system_msg},
+                      {"role": "user", "content": user_msg}],
+            temperature=0.2,
+            max_tokens=1200,
+            stream=True,
+        )
+        full = []
+        for chunk in stream:
+            delta = getattr(chunk.choices[0].delta, "content", None)
+            if delta:
+                if not full:
+                    ttft_ms = (time.perf_counter() - t0) * 1000.0
+                    observe("first_token", ttft_ms)
+                    event("first_token", ttft_ms=round(ttft_ms, 3))
+                print(delta, end="", flush=True)
+                full.append(delta)
+        print()
+        sp["n_chunks"] = len(full)
     return "".join(full)
 
 def slugify(s: str) -> str:
@@ -260,19 +238,26 @@ def slugify(s: str) -> str:
     s = re.sub(r"[^a-z0-9]+", "-", s).strip("-")
     return s
 
-def save_report_md(sector: str, scenario_text: str, md_text: str) -> Path:
+def save_report_md(sector: str, scenario_text: str, md_text: str, **index_meta) -> Path:
     out_dir = REPORTS_DIR / sector
     out_dir.mkdir(parents=True, exist_ok=True)
     ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     fname = f"{ts}__{slugify(sector)}__{slugify(scenario_text[:40])}.md"
     path = out_dir / fname
     path.write_text(md_text, encoding="utf-8")
+    # Keep the report index (data/reports/report_index.sqlite3) in sync, one row per saved file
+    index_report(path, md_text, sector=sector, scenario=scenario_text,
+                 db_path=REPORTS_DIR / "report_index.sqlite3", **index_meta)
     return path
 
-def generate_report(sector: str, question: str, scenario_choice: str, top_k: int = TOP_K) -> Path:
+def generate_report(sector: str, question: str, scenario_choice: str, top_k: int = TOP_K,
+                    organization: Optional[str] = None, category: Optional[str] = None,
+                    date_start: Optional[str] = None, date_end: Optional[str] = None) -> Path:
     sc = scenario_choice  # Use the provided scenario directly
     payload = retrieve_topk(sector, question, sc, top_k=top_k)
-    system_msg, user_msg, sources = build_markdown_prompt(sector, payload)
+    payload["kpi_context"] = format_kpi_context(KPI_INDEX, org=organization, category=category)
+    with span("prompt_build", sector=sector):
+        system_msg, user_msg, sources = build_markdown_prompt(sector, payload)
 
     print(f"\n--- Generating report for sector='{sector}', scenario='{sc}' ---\n")
     md = call_apertus_stream(system_msg, user_msg)
@@ -282,7 +267,13 @@ def generate_report(sector: str, question: str, scenario_choice: str, top_k: int
         md += "\n\n## Sources\n"
         md += "\n".join([f"- {s}" for s in (sources or ["(aucune source RAG)"])])
 
-    out_path = save_report_md(sector, sc, md)
+    with span("save", sector=sector):
+        out_path = save_report_md(
+            sector, sc, md,
+            organization=organization, category=category,
+            date_start=date_start, date_end=date_end,
+            model=APERTUS_MODEL, prompt_version=PROMPT_VERSION, sources=sources,
+        )
     print(f"\n✅ Saved report → {out_path}")
     return out_path
 
@@ -290,14 +281,18 @@ def generate_report(sector: str, question: str, scenario_choice: str, top_k: int
 parsed_data = parse_report_session_data_to_dict("report_session_data.txt")
 
 # Extract values
-sector = parsed_data["sectors"].lower()
+sector = sector_for_industry(parsed_data["sectors"])
 scenario = parsed_data["scenario"]
-question = f"Atteindre {scenario}% de réduction sans perturber les cours ni la sécurité des élèves."
+question = default_question(scenario)
 
 # Call the report generation function
 report_path = generate_report(
     sector=sector,
     question=question,
     scenario_choice=scenario,  # You can make this dynamic if needed
-    top_k=6
+    top_k=6,
+    organization=None if parsed_data["organization"] in (None, "None") else parsed_data["organization"],
+    category=parsed_data["sectors"],
+    date_start=parsed_data["reduction_start"],
+    date_end=parsed_data["reduction_end"],
 )
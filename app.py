@@ -1,36 +1,83 @@
 # streamlit_app.py
 
-import numpy as np
 import streamlit as st
 import datetime as dt
+import functools
 import pandas as pd
-import report_page
-import didier_page
-from sitg_map_component import render_sitg_map
-import ast
-import seaborn as sns
-import matplotlib.pyplot as plt
-
-sns.set_theme(style="whitegrid")
-sns.set_context("talk", font_scale=0.9)
-sns.set_palette(sns.color_palette(["#2ecc71"]))
+import page_router
+from page_router import go
+import prefetcher
+from energy_data import add_pct_deviation, aggregate_energy, read_sheet_cached, select_egids
+from kpi_engine import KpiIndex, build_kpi_table, clean_energy_data
+from scenario_simulator import CARRIER_MIXES, ScenarioSimulator, rolling_windows
+from telemetry import new_correlation_id, set_correlation_id, span, start_metrics_server
+
+# Heavy modules (Folium, chromadb, sentence-transformers) are imported only by the route that
+# needs them; `python startup_benchmark.py` enforces the cold-start budget.
+
+
+def deviation_chart(df: pd.DataFrame, series, title: str):
+    """
+    Vega-Lite line chart of % deviation columns around a dashed zero line, with a symmetric y-axis.
+    `series` = [(column, color, label)]; drawn by the browser, so no plotting library is imported.
+    """
+    series = [(c, color, label) for c, color, label in series if c in df.columns]
+    long = pd.concat(
+        [pd.DataFrame({"annee": df["annee"], "pct": df[c], "series": label}) for c, _, label in series]
+        or [pd.DataFrame(columns=["annee", "pct", "series"])],
+        ignore_index=True,
+    )
+    y = {"field": "pct", "type": "quantitative", "title": "% deviation"}
+    if long["pct"].notna().any():
+        y_span = long["pct"].abs().max()
+        y["scale"] = {"domain": [-y_span * 1.1, y_span * 1.1]}
+    color = {"field": "series", "type": "nominal", "title": None,
+             "scale": {"domain": [s[2] for s in series], "range": [s[1] for s in series]},
+             "legend": {"orient": "top-right"} if len(series) > 1 else None}
+    spec = {
+        "title": {"text": title, "color": "#2ecc71", "fontSize": 12},
+        "height": 260,
+        "layer": [
+            {"mark": {"type": "line", "strokeWidth": 2},
+             "encoding": {"x": {"field": "annee", "type": "ordinal", "title": "Year"}, "y": y, "color": color}},
+            {"mark": {"type": "rule", "strokeDash": [4, 4], "color": "#999"}, "encoding": {"y": {"datum": 0}}},
+        ],
+    }
+    st.vega_lite_chart(long, spec, use_container_width=True)
 
 
 # --- App setup
 st.set_page_config(page_title="Geneva Map + Hidden Report", layout="wide")
-buildings = pd.read_csv('data/buildings_cleaned.csv')
-general_data=pd.read_excel('data/data_raw.xlsx', sheet_name='Clean_Data')
 
-if "route" not in st.session_state:
-    # Read initial route from ?page=...
-    st.session_state.route = st.query_params.get("page", "map")
+# One correlation ID per browser session, bound to every span of this script run
+if "correlation_id" not in st.session_state:
+    st.session_state.correlation_id = new_correlation_id()
+set_correlation_id(st.session_state.correlation_id)
+start_metrics_server()  # only if PRISMAI_METRICS_PORT is set
+
+
+@st.cache_resource(show_spinner=False)
+def load_data():
+    """Read the source files and build the KPI index once per server process (shared, read-only)."""
+    with span("csv_load", file="buildings_cleaned.csv"):
+        buildings = pd.read_csv('data/buildings_cleaned.csv')
+    with span("excel_load", sheet="Clean_Data"):
+        general_data = read_sheet_cached('data/data_raw.xlsx', 'Clean_Data')  # CSV copy, no openpyxl
+    # KPI layer (kWh/m², YoY deltas, peer percentiles) computed once, looked up by index afterwards
+    with span("kpi_build"):
+        kpi_index = KpiIndex(build_kpi_table(general_data, buildings))
+    return buildings, general_data, kpi_index
+
+
+@st.cache_resource(show_spinner=False)
+def load_simulator():
+    """Per-organisation baselines for the what-if sweep (built once per server process)."""
+    buildings, general_data, _ = load_data()
+    with span("simulator_build"):
+        return ScenarioSimulator(buildings, general_data)
 
 
-def go(route: str):
-    # Update state + URL, then rerun
-    st.session_state.route = route
-    st.query_params["page"] = route
-    st.rerun()
+buildings, general_data, kpi_index = load_data()
 
 
 # --- Common UI elements (top bar)
@@ -141,50 +188,27 @@ def render_map_page():
             st.stop()
 
     # ---- Build org_data depending on selections
-    # Clean year to int if needed (e.g., "2,023" -> 2023)
-    def _to_year(x):
-        try:
-            return int(str(x).replace(",", "").strip())
-        except Exception:
-            return np.nan
-
-    gdf = general_data.copy()
-    gdf["annee"] = gdf["annee"].map(_to_year)
-    # Coerce energy columns to numeric (handle stray commas)
-    for col in ["kwh_electrique", "kwh_gaz", "kwh_cad", "kwh_mazout"]:
-        if col in gdf.columns:
-            gdf[col] = pd.to_numeric(gdf[col].astype(str).str.replace(",", "", regex=False), errors="coerce")
+    # Clean year to int (e.g., "2,023" -> 2023) and coerce energy columns to numeric
+    with span("cleaning"):
+        gdf = clean_energy_data(general_data)
 
     org = st.session_state.get("organization")
     ind = st.session_state.get("industry")
 
-    if org:  # organization chosen -> use that org’s rows directly
-        org_data = gdf[gdf["nom"] == org].copy()
-    else:
-        if ind and ind != "None":  # no org, but industry chosen -> aggregate within that industry
-            org_data = (
-                gdf[gdf["category"] == ind]
-                .groupby("annee", as_index=False)
-                .sum(numeric_only=True)
-            )
-        else:  # neither org nor specific industry -> aggregate across all industries
-            org_data = gdf.groupby("annee", as_index=False).sum(numeric_only=True)
+    # Collect EGIDs depending on selection, and start warming geometries + report context now
+    with span("egid_flatten"):
+        egids = select_egids(buildings, org, ind)
+    prefetcher.for_session(st.session_state).update(
+        egids, ind, org, st.session_state.get("reduction_supply"), kpi_index=kpi_index,
+    )
+
+    with span("aggregation", organization=org, industry=ind):
+        org_data = aggregate_energy(gdf, org, ind)
 
     # ---- Charts
     st.title("📈 Energy Trends")
     col1, col2 = st.columns(2)
 
-    def add_pct_deviation(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
-        out = df.copy()
-        for c in cols:
-            if c in out.columns and out[c].notna().any():
-                m = out[c].mean(skipna=True)
-                if pd.notna(m) and m != 0:
-                    out[f"{c}_pct"] = (out[c] / m - 1.0) * 100.0
-                else:
-                    out[f"{c}_pct"] = np.nan
-        return out
-
     org_data = add_pct_deviation(
         org_data,
         cols=["kwh_electrique", "kwh_gaz", "kwh_cad", "kwh_mazout"]
@@ -196,90 +220,86 @@ def render_map_page():
         return
 
     # ===== Left chart: Electricity % deviation =====
-    with col1:
-        fig1, ax1 = plt.subplots(figsize=(10, 3))
-        if "kwh_electrique_pct" in org_data.columns:
-            sns.lineplot(
-                data=org_data,
-                x="annee", y="kwh_electrique_pct",
-                linewidth=1.5, ax=ax1, color="#2ecc71"
-            )
-            ax1.axhline(0, ls="--", lw=1, color="#999")
-            lo, hi = org_data["kwh_electrique_pct"].min(), org_data["kwh_electrique_pct"].max()
-            span = max(abs(lo), abs(hi))
-            ax1.set_ylim(-span * 1.1, span * 1.1)
-
-        ax1.set_title("Electricity: % vs 4-year avg", fontsize=12, color="#2ecc71")
-        ax1.set_xlabel("Year", fontsize=10)
-        ax1.set_ylabel("% deviation", fontsize=10)
-        ax1.set(xticks=years)
-        sns.despine(ax=ax1)
-        st.pyplot(fig1, clear_figure=True, use_container_width=True)
+    with col1, span("chart_render", chart="electricity"):
+        deviation_chart(org_data, [("kwh_electrique_pct", "#2ecc71", "Électricité")],
+                        "Electricity: % vs 4-year avg")
 
     # ===== Right chart: Fuels/Heat % deviation =====
-    with col2:
-        fig2, ax2 = plt.subplots(figsize=(10, 3))
-
-        plotted = False
-        for col, color, label in [
-            ("kwh_gaz_pct", "#2ecc71", "Gaz"),
-            ("kwh_cad_pct", "#9acc2e", "Cad"),
-            ("kwh_mazout_pct", "#3e64d7", "Mazout"),
-        ]:
-            if col in org_data.columns:
-                sns.lineplot(data=org_data, x="annee", y=col,
-                             linewidth=2, ax=ax2, color=color, label=label)
-                plotted = True
-
-        if plotted:
-            ax2.axhline(0, ls="--", lw=1, color="#999")
-            vals = []
-            for c in ["kwh_gaz_pct", "kwh_cad_pct", "kwh_mazout_pct"]:
-                if c in org_data.columns and org_data[c].notna().any():
-                    vals += org_data[c].tolist()
-            if vals:
-                lo, hi = np.nanmin(vals), np.nanmax(vals)
-                span = max(abs(lo), abs(hi))
-                ax2.set_ylim(-span * 1.1, span * 1.1)
-
-        ax2.set_title("Fuels/Heat: % vs 4-year avg", fontsize=12, color="#2ecc71")
-        ax2.set_xlabel("Year", fontsize=10)
-        ax2.set_ylabel("% deviation", fontsize=10)
-        ax2.set(xticks=years)
-        if plotted:
-            ax2.legend(frameon=False, fontsize=8)
-        sns.despine(ax=ax2)
-        st.pyplot(fig2, clear_figure=True, use_container_width=True)
+    with col2, span("chart_render", chart="fuels"):
+        deviation_chart(
+            org_data,
+            [("kwh_gaz_pct", "#2ecc71", "Gaz"), ("kwh_cad_pct", "#9acc2e", "Cad"), ("kwh_mazout_pct", "#3e64d7", "Mazout")],
+            "Fuels/Heat: % vs 4-year avg",
+        )
+
+    # ---- Peer comparison (precomputed KPI layer)
+    st.subheader("🏷️ Energy intensity vs peers (kWh/m²)")
+    kpi_cols = {
+        "nom": "Organization",
+        "annee": "Year",
+        "kwh_total_per_m2": "Total kWh/m²",
+        "kwh_electrique_per_m2": "Elec. kWh/m²",
+        "kwh_total_per_m2_yoy_pct": "YoY %",
+        "kwh_total_per_m2_rank": "Rank",
+        "kwh_total_per_m2_pctile": "Percentile",
+    }
+    if org:
+        peer_kpis = kpi_index.peers(org)
+    elif ind and ind != "None":
+        peer_kpis = kpi_index.category_kpis(ind)
+        peer_kpis = peer_kpis[peer_kpis["annee"] == peer_kpis["annee"].max()] if not peer_kpis.empty else peer_kpis
+    else:
+        peer_kpis = kpi_index.kpis.iloc[0:0]
+    if peer_kpis.empty:
+        st.caption("Select an industry to compare organizations with their peers.")
+    else:
+        st.dataframe(
+            peer_kpis[list(kpi_cols)].rename(columns=kpi_cols).round(1),
+            hide_index=True,
+            use_container_width=True,
+        )
+
+    # ---- What-if sweep (vectorised, no LLM call)
+    with st.expander("🧪 What-if sweep: savings across targets, windows and carrier mixes"):
+        sim = load_simulator()
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            sweep_targets = st.multiselect("Targets (%)", options=[5, 10, 15, 20, 25, 30, 40, 50],
+                                           default=[10, 20, 30], key="sweep_targets")
+        with c2:
+            sweep_lengths = st.multiselect("Extra window lengths (days)", options=[7, 30, 90, 180, 365],
+                                           default=[30, 90], key="sweep_lengths")
+        with c3:
+            sweep_mixes = st.multiselect("Carrier mixes", options=list(CARRIER_MIXES),
+                                         default=list(CARRIER_MIXES)[:3], key="sweep_mixes")
+        sweep_by = "organisation" if org or (ind and ind != "None") else "category"
+
+        if sweep_targets and sweep_mixes:
+            windows = rolling_windows(st.session_state["reduction_start"], st.session_state["reduction_end"],
+                                      sweep_lengths)
+            with span("scenario_sweep", n_scenarios=len(sweep_targets) * len(windows) * len(sweep_mixes)):
+                sweep = sim.to_frame(sim.run_grid(sweep_targets, windows, sweep_mixes), by=sweep_by)
+            if org:
+                sweep = sweep[sweep["organisation"] == org]
+            elif ind and ind != "None":
+                sweep = sweep[sweep["organisation"].isin(sim.organisations[sim.categories == ind])]
+            st.dataframe(sweep.round({"saved_kwh": 0, "saved_co2_t": 2}), hide_index=True,
+                         use_container_width=True)
+        else:
+            st.caption("Pick at least one target and one carrier mix.")
 
     # ---- Basemap
     st.subheader("Basemap")
-    # Collect EGIDs depending on selection
-    def _flatten_egids(series):
-        """Series holds strings like '[2037603, 295147434]'; return flat list of ints."""
-        out = []
-        for v in series.dropna().tolist():
-            try:
-                lst = v if isinstance(v, list) else ast.literal_eval(str(v))
-                out.extend(int(x) for x in lst)
-            except Exception:
-                continue
-        # dedupe, preserve order
-        return list(dict.fromkeys(out))
-
-    if org:  # plot buildings for selected organization
-        egids = _flatten_egids(buildings.loc[buildings["nom"] == org, "EGIDs"])
+    if not st.session_state.get("_map_deferred"):
+        # First view of the session: paint the page without waiting for Folium + SITG, then rerun
+        st.session_state["_map_deferred"] = True
+        st.caption("Loading map…")
+        st.rerun()
+    with span("map_render", n_egids=len(egids)):
+        from sitg_map_component import render_sitg_map  # Folium loads with the first map only
         render_sitg_map(egids)
-    else:
-        if ind and ind != "None":  # all buildings in the chosen industry
-            egids = _flatten_egids(buildings.loc[buildings["category"] == ind, "EGIDs"])
-        else:  # no industry -> all buildings
-            egids = _flatten_egids(buildings["EGIDs"])
-        render_sitg_map(egids)
-
-import didier_page
 
-if st.session_state.route == "report":
-    report_page.render()
-else:
-    render_map_page()
+page_router.register("map", render_map_page)
+page_router.register("report", "report_page:render")
+page_router.render()
 
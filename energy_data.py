@@ -0,0 +1,79 @@
+# energy_data.py
+import ast
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------------
+# Data-path helpers of the map page (kept free of Streamlit so they can be benchmarked)
+# ------------------------------------------------------------
+CACHE_DIR = Path("data") / "cache"
+
+
+def read_sheet_cached(xlsx_path, sheet_name: str, cache_dir=CACHE_DIR) -> pd.DataFrame:
+    """
+    One workbook sheet through a CSV copy in `cache_dir`, rewritten whenever the workbook is newer.
+    Parsing the workbook (openpyxl import included) takes ~0.2-0.6 s on a cold start, the CSV a few ms.
+    """
+    xlsx_path = Path(xlsx_path)
+    cached = Path(cache_dir) / f"{xlsx_path.stem}__{sheet_name}.csv"
+    if cached.exists() and cached.stat().st_mtime >= xlsx_path.stat().st_mtime:
+        return pd.read_csv(cached, float_precision="round_trip")
+    df = pd.read_excel(xlsx_path, sheet_name=sheet_name)
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_name(cached.name + f".{os.getpid()}.tmp")
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, cached)  # atomic: concurrent readers never see a partial file
+    return df
+
+
+
+def aggregate_energy(gdf: pd.DataFrame, org: str = None, ind: str = None) -> pd.DataFrame:
+    """
+    Rows to plot for the current selection:
+    - organization chosen      -> that org’s rows directly
+    - industry chosen, no org  -> yearly sum within that industry
+    - neither                  -> yearly sum across all industries
+    """
+    if org:
+        return gdf[gdf["nom"] == org].copy()
+    if ind and ind != "None":
+        return gdf[gdf["category"] == ind].groupby("annee", as_index=False).sum(numeric_only=True)
+    return gdf.groupby("annee", as_index=False).sum(numeric_only=True)
+
+
+def add_pct_deviation(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    """Add `<col>_pct`: % deviation of each value from the column mean."""
+    out = df.copy()
+    for c in cols:
+        if c in out.columns and out[c].notna().any():
+            m = out[c].mean(skipna=True)
+            if pd.notna(m) and m != 0:
+                out[f"{c}_pct"] = (out[c] / m - 1.0) * 100.0
+            else:
+                out[f"{c}_pct"] = np.nan
+    return out
+
+
+def flatten_egids(series: pd.Series) -> list:
+    """Series holds strings like '[2037603, 295147434]'; return flat list of ints."""
+    out = []
+    for v in series.dropna().tolist():
+        try:
+            lst = v if isinstance(v, list) else ast.literal_eval(str(v))
+            out.extend(int(x) for x in lst)
+        except Exception:
+            continue
+    # dedupe, preserve order
+    return list(dict.fromkeys(out))
+
+
+def select_egids(buildings: pd.DataFrame, org: str = None, ind: str = None) -> list:
+    """EGIDs of the selected organization, else of the selected industry, else of all buildings."""
+    if org:
+        return flatten_egids(buildings.loc[buildings["nom"] == org, "EGIDs"])
+    if ind and ind != "None":
+        return flatten_egids(buildings.loc[buildings["category"] == ind, "EGIDs"])
+    return flatten_egids(buildings["EGIDs"])
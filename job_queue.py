@@ -0,0 +1,282 @@
+# job_queue.py
+import argparse
+import importlib
+import json
+import multiprocessing as mp
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+
+from telemetry import profiled, set_correlation_id, share_metrics, span
+
+# ------------------------------------------------------------
+# Persistent local job queue (SQLite) + worker processes
+#
+# - PRISMAI_JOB_DB       : queue database (default: data/jobs/jobs.sqlite3)
+# - PRISMAI_JOB_WORKERS  : number of worker processes (default: CPU count, capped at 4)
+# ------------------------------------------------------------
+JOB_DB = Path(os.getenv("PRISMAI_JOB_DB", "data/jobs/jobs.sqlite3"))
+POLL_INTERVAL = 0.5          # seconds between two claims when the queue is empty
+HEARTBEAT_INTERVAL = 5.0     # seconds between two heartbeats of a running job
+STALE_AFTER = 60.0           # running job without heartbeat for this long -> requeued
+MAX_ATTEMPTS = 3             # a job whose worker died this many times is marked failed
+
+# Job kind -> "module:function". Handlers are called as fn(payload, progress=callback).
+JOB_HANDLERS = {
+    "report": "rag_engine:run_rag_pipeline",
+}
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id               TEXT PRIMARY KEY,
+    kind             TEXT NOT NULL,
+    payload          TEXT NOT NULL,
+    status           TEXT NOT NULL,
+    progress         REAL NOT NULL DEFAULT 0,
+    message          TEXT,
+    result           TEXT,
+    error            TEXT,
+    worker           TEXT,
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at       REAL NOT NULL,
+    started_at       REAL,
+    heartbeat_at     REAL,
+    finished_at      REAL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs(status, created_at);
+"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler (through its progress callback) once cancellation was requested."""
+
+
+def connect(db_path=JOB_DB) -> sqlite3.Connection:
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = None if job["result"] is None else json.loads(job["result"])
+    return job
+
+
+# ------------------------------------------------------------
+# Client side (Streamlit pages)
+# ------------------------------------------------------------
+def submit(kind: str, payload: dict, db_path=JOB_DB) -> str:
+    """Queue a job and return its ID immediately."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind '{kind}'. Choose among {list(JOB_HANDLERS)}.")
+    job_id = uuid.uuid4().hex
+    conn = connect(db_path)
+    try:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload, ensure_ascii=False, default=str), QUEUED, time.time()),
+        )
+    finally:
+        conn.close()
+    return job_id
+
+
+def get_job(job_id: str, db_path=JOB_DB):
+    """Current job state as a dict (payload/result decoded), or None if unknown."""
+    conn = connect(db_path)
+    try:
+        return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+    finally:
+        conn.close()
+
+
+def cancel(job_id: str, db_path=JOB_DB) -> bool:
+    """
+    Cancel a job: queued jobs are cancelled at once, running ones at their next progress update.
+    Returns False if the job had already finished.
+    """
+    conn = connect(db_path)
+    try:
+        cur = conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, cancel_requested = 1 WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, QUEUED),
+        )
+        if cur.rowcount:
+            return True
+        cur = conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+        return bool(cur.rowcount)
+    finally:
+        conn.close()
+
+
+def list_jobs(status: str = None, limit: int = 50, db_path=JOB_DB):
+    conn = connect(db_path)
+    try:
+        if status:
+            rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit))
+        else:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [_row_to_job(r) for r in rows.fetchall()]
+    finally:
+        conn.close()
+
+
+# ------------------------------------------------------------
+# Worker side
+# ------------------------------------------------------------
+def _claim_next(conn: sqlite3.Connection, worker_id: str):
+    """
+    Atomically take the oldest queued job. Stale running jobs (dead worker) are requeued first,
+    or marked failed once they used up MAX_ATTEMPTS, so a job that kills its worker is not re-run forever.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = NULL, finished_at = ?,"
+            " error = 'Worker stopped responding on each of the ' || attempts || ' attempts.'"
+            " WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+            (FAILED, now, RUNNING, now - STALE_AFTER, MAX_ATTEMPTS),
+        )
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat_at < ?",
+            (QUEUED, RUNNING, now - STALE_AFTER),
+        )
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, started_at = ?, heartbeat_at = ?,"
+            " progress = 0, message = NULL WHERE id = ?",
+            (RUNNING, worker_id, now, now, row["id"]),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+
+def _resolve_handler(kind: str):
+    module, _, attr = JOB_HANDLERS[kind].partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def _run_job(conn: sqlite3.Connection, job: dict):
+    job_id = job["id"]
+    lock = threading.Lock()  # the connection is shared with the heartbeat thread
+
+    def progress(fraction: float = None, message: str = None):
+        """Handler callback: record progress and honour cancellation requests."""
+        with lock:
+            conn.execute(
+                "UPDATE jobs SET progress = COALESCE(?, progress), message = COALESCE(?, message),"
+                " heartbeat_at = ? WHERE id = ?",
+                (fraction, message, time.time(), job_id),
+            )
+            flag = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+        if flag:
+            raise JobCancelled(job_id)
+
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            with lock:
+                conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+
+    hb = threading.Thread(target=heartbeat, daemon=True)
+    hb.start()
+
+    payload = job["payload"]
+    set_correlation_id(payload.get("correlation_id") if isinstance(payload, dict) else None)
+    status, result, error = DONE, None, None
+    try:
+        with span("job", kind=job["kind"], job_id=job_id, attempt=job["attempts"]), profiled(f"job_{job['kind']}"):
+            result = _resolve_handler(job["kind"])(payload, progress=progress)
+    except JobCancelled:
+        status = CANCELLED
+    except Exception:
+        status, error = FAILED, traceback.format_exc()
+    finally:
+        stop.set()
+        hb.join()
+
+    with lock:
+        conn.execute(
+            "UPDATE jobs SET status = ?, progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END,"
+            " result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, status, json.dumps(result, ensure_ascii=False, default=str), error, time.time(), job_id),
+        )
+
+
+def run_worker(worker_id: str = None, db_path=JOB_DB, once: bool = False):
+    """Worker loop: claim, run, persist result; sleeps POLL_INTERVAL when the queue is empty."""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    share_metrics()  # job / rag_pipeline histograms reach the app's /metrics endpoint
+    conn = connect(db_path)
+    while True:
+        job = _claim_next(conn, worker_id)
+        if job is None:
+            if once:
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+        _run_job(conn, job)
+
+
+def default_worker_count() -> int:
+    return int(os.getenv("PRISMAI_JOB_WORKERS") or min(os.cpu_count() or 1, 4))
+
+
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def ensure_workers(n: int = None, db_path=JOB_DB):
+    """
+    Start `n` worker processes once per server process (no-op on later Streamlit reruns).
+    Set PRISMAI_JOB_WORKERS=0 to rely on externally started workers (`python job_queue.py`).
+    """
+    n = default_worker_count() if n is None else n
+    with _workers_lock:
+        _workers[:] = [p for p in _workers if p.is_alive()]
+        ctx = mp.get_context("spawn")  # fresh interpreter: no Streamlit state inherited
+        for i in range(len(_workers), n):
+            p = ctx.Process(target=run_worker, kwargs={"db_path": str(db_path)}, name=f"prismai-worker-{i}", daemon=True)
+            p.start()
+            _workers.append(p)
+    return list(_workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run report-generation workers.")
+    parser.add_argument("--workers", type=int, default=default_worker_count())
+    parser.add_argument("--db", default=str(JOB_DB))
+    args = parser.parse_args()
+
+    procs = [mp.Process(target=run_worker, kwargs={"db_path": args.db}) for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
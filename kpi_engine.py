@@ -0,0 +1,172 @@
+# kpi_engine.py
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------------
+# Energy-intensity KPI layer (computed once, at load time)
+# ------------------------------------------------------------
+ENERGY_COLS = ["kwh_electrique", "kwh_gaz", "kwh_cad", "kwh_mazout"]
+CARRIER_LABELS = {
+    "kwh_electrique": "Électricité",
+    "kwh_gaz": "Gaz",
+    "kwh_cad": "CAD",
+    "kwh_mazout": "Mazout",
+}
+SURFACE_COL = "surface_ref_energetique"
+
+
+def _to_year(x):
+    try:
+        return int(str(x).replace(",", "").strip())
+    except Exception:
+        return np.nan
+
+
+def clean_energy_data(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalise the raw 'Clean_Data' sheet:
+    - year to int (e.g. "2,023" -> 2023)
+    - energy / surface columns to numeric (stray commas removed)
+    """
+    out = df.copy()
+    out["annee"] = out["annee"].map(_to_year)
+    for col in ENERGY_COLS + ["surface_nette", SURFACE_COL]:
+        if col in out.columns:
+            out[col] = pd.to_numeric(out[col].astype(str).str.replace(",", "", regex=False), errors="coerce")
+    return out
+
+
+def build_kpi_table(general_data: pd.DataFrame, buildings: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Build one KPI row per (organisation, year):
+    - kWh/m² per carrier and in total (divided by the energy reference surface, SRE)
+    - year-over-year delta of each intensity, in %
+    - rank (1 = lowest intensity) and percentile within the organisation's category and year
+    Falls back to the SRE of `buildings_cleaned.csv` when the raw sheet has none.
+    """
+    df = clean_energy_data(general_data)
+    df = df.dropna(subset=["nom", "annee"])
+
+    if buildings is not None and "SRE" in buildings.columns:
+        sre = buildings.drop_duplicates("nom").set_index("nom")["SRE"]
+        fallback = df["nom"].map(sre)
+        df[SURFACE_COL] = df[SURFACE_COL].fillna(fallback) if SURFACE_COL in df.columns else fallback
+
+    carriers = [c for c in ENERGY_COLS if c in df.columns]
+    df["kwh_total"] = df[carriers].sum(axis=1, min_count=1)
+
+    surface = df[SURFACE_COL].where(df[SURFACE_COL] > 0)
+    intensity_cols = []
+    for c in carriers + ["kwh_total"]:
+        name = f"{c}_per_m2"
+        df[name] = df[c] / surface
+        intensity_cols.append(name)
+
+    df = df.sort_values(["nom", "annee"]).reset_index(drop=True)
+    by_org = df.groupby("nom", sort=False)
+    for c in intensity_cols:
+        df[f"{c}_yoy_pct"] = by_org[c].pct_change(fill_method=None) * 100.0
+
+    by_peer = df.groupby(["category", "annee"], sort=False)
+    # Peers with a computable total intensity (orgs without surface are not ranked)
+    df["peer_count"] = by_peer["kwh_total_per_m2"].transform("count")
+    for c in intensity_cols:
+        df[f"{c}_rank"] = by_peer[c].rank(method="min", ascending=True)
+        df[f"{c}_pctile"] = by_peer[c].rank(method="average", pct=True) * 100.0
+
+    df = df.replace([np.inf, -np.inf], np.nan)
+    df["annee"] = df["annee"].astype(int)
+    return df
+
+
+class KpiIndex:
+    """
+    Indexed view over the KPI table so lookups never re-run a groupby:
+    - `by_org`  : (nom, annee) -> KPI row
+    - `by_peer` : (category, annee) -> all organisations of that category for that year
+    """
+
+    def __init__(self, kpis: pd.DataFrame):
+        self.kpis = kpis
+        self.by_org = kpis.set_index(["nom", "annee"]).sort_index()
+        self.by_peer = kpis.set_index(["category", "annee"]).sort_index()
+        self.category_of = kpis.drop_duplicates("nom").set_index("nom")["category"].to_dict()
+
+    def years(self, org: str) -> list:
+        if org not in self.category_of:
+            return []
+        return self.by_org.loc[org].index.tolist()
+
+    def org_kpis(self, org: str) -> pd.DataFrame:
+        """All years of KPIs for one organisation (empty frame if unknown)."""
+        if org not in self.category_of:
+            return self.kpis.iloc[0:0]
+        return self.by_org.loc[org].reset_index()
+
+    def peers(self, org: str, year: int = None) -> pd.DataFrame:
+        """Organisations of the same category for `year` (defaults to the org's latest year)."""
+        years = self.years(org)
+        if not years:
+            return self.kpis.iloc[0:0]
+        year = years[-1] if year is None else year
+        key = (self.category_of[org], year)
+        if key not in self.by_peer.index:
+            return self.kpis.iloc[0:0]
+        return self.by_peer.loc[[key]].reset_index().sort_values("kwh_total_per_m2_rank")
+
+    def category_kpis(self, category: str) -> pd.DataFrame:
+        """All years / organisations of one category."""
+        if category not in self.by_peer.index.get_level_values(0):
+            return self.kpis.iloc[0:0]
+        return self.by_peer.loc[category].reset_index()
+
+
+def format_kpi_context(index: KpiIndex, org: str = None, category: str = None) -> str:
+    """
+    Render the KPI table as a compact Markdown block for the report prompt.
+    - organisation selected -> its yearly intensities + peer position for the latest year
+    - category only         -> every organisation of the category for the latest year
+    """
+    def _fmt(v, unit="", digits=1):
+        return "n/d" if pd.isna(v) else f"{v:,.{digits}f}{unit}".replace(",", "'")
+
+    def _rank(r):
+        return "n/d" if pd.isna(r["kwh_total_per_m2_rank"]) else f"{int(r['kwh_total_per_m2_rank'])}/{int(r['peer_count'])}"
+
+    lines = []
+    if org and org in index.category_of:
+        rows = index.org_kpis(org)
+        lines.append(f"Organisation: {org} (catégorie: {index.category_of[org]})")
+        lines.append("| Année | kWh/m² total | Élec. kWh/m² | Gaz kWh/m² | CAD kWh/m² | Mazout kWh/m² | Δ total a/a | Percentile catégorie |")
+        lines.append("|---|---|---|---|---|---|---|---|")
+        for _, r in rows.iterrows():
+            lines.append(
+                f"| {r['annee']} | {_fmt(r['kwh_total_per_m2'])} | {_fmt(r.get('kwh_electrique_per_m2'))} "
+                f"| {_fmt(r.get('kwh_gaz_per_m2'))} | {_fmt(r.get('kwh_cad_per_m2'))} | {_fmt(r.get('kwh_mazout_per_m2'))} "
+                f"| {_fmt(r['kwh_total_per_m2_yoy_pct'], ' %')} | {_fmt(r['kwh_total_per_m2_pctile'], '', 0)} |"
+            )
+        peers = index.peers(org)
+        if len(peers) > 1:
+            me = peers[peers["nom"] == org].iloc[0]
+            position = (f"non classée (surface manquante), {int(me['peer_count'])} classées"
+                        if pd.isna(me["kwh_total_per_m2_rank"])
+                        else f"{int(me['kwh_total_per_m2_rank'])}/{int(me['peer_count'])} (1 = plus sobre)")
+            lines.append(
+                f"Position {position} parmi les organisations '{me['category']}' en {me['annee']}; "
+                f"médiane catégorie: {_fmt(peers['kwh_total_per_m2'].median())} kWh/m²."
+            )
+    elif category and category != "None":
+        rows = index.category_kpis(category)
+        if rows.empty:
+            return ""
+        last = rows["annee"].max()
+        rows = rows[rows["annee"] == last].sort_values("kwh_total_per_m2_rank")
+        lines.append(f"Catégorie: {category} — année {last}")
+        lines.append("| Organisation | kWh/m² total | Δ total a/a | Rang |")
+        lines.append("|---|---|---|---|")
+        for _, r in rows.iterrows():
+            lines.append(
+                f"| {r['nom']} | {_fmt(r['kwh_total_per_m2'])} | {_fmt(r['kwh_total_per_m2_yoy_pct'], ' %')} "
+                f"| {_rank(r)} |"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,54 @@
+# page_router.py
+import importlib
+
+import streamlit as st
+
+from telemetry import span
+
+# ------------------------------------------------------------
+# Lazy page router
+# - Pages register as "module:function" strings; the module is only imported
+#   the first time its route is rendered (keeps cold start free of heavy deps).
+# ------------------------------------------------------------
+DEFAULT_ROUTE = "map"
+ROUTES = {}
+
+
+def register(route: str, target):
+    """Register a page: `target` is a callable or a lazy "module:function" reference."""
+    ROUTES[route] = target
+
+
+def current_route(default: str = DEFAULT_ROUTE) -> str:
+    if "route" not in st.session_state:
+        # Read initial route from ?page=...
+        st.session_state.route = st.query_params.get("page", default)
+    return st.session_state.route
+
+
+def go(route: str, **params):
+    """Update state + URL, then rerun."""
+    st.session_state.route = route
+    st.query_params["page"] = route
+    for k, v in params.items():
+        st.query_params[k] = str(v)
+    st.rerun()
+
+
+def _resolve(target):
+    if callable(target):
+        return target
+    module, _, attr = target.partition(":")
+    with span("page_import", module=module):
+        return getattr(importlib.import_module(module), attr or "render")
+
+
+def render(route: str = None, default: str = DEFAULT_ROUTE):
+    """Render the page registered for `route` (unknown routes fall back to `default`)."""
+    route = route or current_route(default)
+    target = ROUTES.get(route, ROUTES.get(default))
+    if target is None:
+        st.error(f"No page registered for route '{route}'.")
+        return
+    with span("page_render", route=route):
+        return _resolve(target)()
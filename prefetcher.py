@@ -0,0 +1,190 @@
+# prefetcher.py
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from telemetry import get_correlation_id, set_correlation_id, span
+
+# ------------------------------------------------------------
+# Speculative background prefetch on selection change
+#
+# While the user is still looking at the map page we already know the EGIDs to draw and the
+# sector / scenario the report button will use, so the expensive I/O starts right away:
+# - SITG geometries for the EGIDs           (GEOMETRY_CACHE, read by render_sitg_map)
+# - sector retrieval + KPI prompt context   (CONTEXT_CACHE, attached to the report job)
+#
+# - PRISMAI_PREFETCH=0          : disable
+# - PRISMAI_PREFETCH_WORKERS    : threads shared by all sessions (default 2)
+# ------------------------------------------------------------
+PREFETCH_WORKERS = int(os.getenv("PRISMAI_PREFETCH_WORKERS", "2"))
+
+
+class SingleFlightCache:
+    """
+    Bounded LRU of key -> Future. Concurrent callers of the same key share one computation,
+    so a render that arrives while a prefetch is in flight waits for it instead of refetching.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def _future(self, key):
+        """(future, is_owner): the caller that creates the future must compute it."""
+        with self._lock:
+            fut = self._items.get(key)
+            if fut is not None and not (fut.done() and (fut.cancelled() or fut.exception() is not None)):
+                self._items.move_to_end(key)
+                return fut, False
+            fut = self._items[key] = Future()
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            return fut, True
+
+    def get_or_compute(self, key, fn, *args, **kwargs):
+        """Blocking: cached/in-flight value, or compute it in the calling thread."""
+        fut, owner = self._future(key)
+        if owner:
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except BaseException as exc:
+                fut.set_exception(exc)
+        return fut.result()
+
+    def peek(self, key):
+        """Value if already computed, else None (never blocks, never computes)."""
+        with self._lock:
+            fut = self._items.get(key)
+        if fut is None or not fut.done() or fut.cancelled() or fut.exception() is not None:
+            return None
+        return fut.result()
+
+    def discard(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+GEOMETRY_CACHE = SingleFlightCache(maxsize=32)
+CONTEXT_CACHE = SingleFlightCache(maxsize=64)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prismai-prefetch")
+        return _executor
+
+
+def enabled() -> bool:
+    return os.getenv("PRISMAI_PREFETCH", "1") != "0"
+
+
+# ------------------------------------------------------------
+# Warm-up tasks
+# ------------------------------------------------------------
+def geometry_key(egids) -> tuple:
+    return tuple(int(e) for e in egids)
+
+
+def get_buildings_by_egid(egids):
+    """fetch_buildings_by_egid through GEOMETRY_CACHE (shared with the prefetcher)."""
+    from sitg_map_component import fetch_buildings_by_egid
+    return GEOMETRY_CACHE.get_or_compute(geometry_key(egids), fetch_buildings_by_egid, list(egids))
+
+
+def context_key(industry, organization, scenario) -> tuple:
+    return (industry or "None", organization or None, str(scenario))
+
+
+def build_report_context(industry, organization, scenario, kpi_index=None) -> dict:
+    """Retrieval chunks + KPI block for the report prompt (what the report job would compute)."""
+    from retriever import default_question, retrieve, sector_for_industry
+
+    sector = sector_for_industry(industry)
+    question = default_question(scenario)
+    context = retrieve(sector, question, str(scenario))
+    if kpi_index is not None:
+        from kpi_engine import format_kpi_context
+        context["kpi_context"] = format_kpi_context(kpi_index, org=organization, category=industry)
+    return context
+
+
+def get_report_context(industry, organization, scenario, kpi_index=None) -> dict:
+    return CONTEXT_CACHE.get_or_compute(
+        context_key(industry, organization, scenario),
+        build_report_context, industry, organization, scenario, kpi_index,
+    )
+
+
+def peek_report_context(industry, organization, scenario):
+    """Prefetched report context if it is ready, else None (the job then retrieves itself)."""
+    return CONTEXT_CACHE.peek(context_key(industry, organization, scenario))
+
+
+# ------------------------------------------------------------
+# Per-session prefetcher
+# ------------------------------------------------------------
+class Prefetcher:
+    """
+    One per browser session. `update()` is called on every rerun with the current selection;
+    only a selection the *user changed* schedules work. The first render's (pre-selected) values
+    are just recorded, so a new session never imports the retrieval stack (chromadb,
+    sentence-transformers) or competes with its first page view. The previous selection's
+    tasks that have not started are cancelled; one already running finishes into the shared
+    cache (harmless, and it may serve the next selection).
+    """
+
+    def __init__(self):
+        self.selection = None
+        self._cancel = threading.Event()
+        self._futures = []
+
+    def cancel(self):
+        self._cancel.set()
+        for f in self._futures:
+            f.cancel()
+        self._futures = []
+
+    def update(self, egids, industry, organization, scenario, kpi_index=None):
+        if not enabled():
+            return
+        selection = (geometry_key(egids), context_key(industry, organization, scenario))
+        if selection == self.selection:
+            return
+        first_render, self.selection = self.selection is None, selection
+        if first_render:
+            return  # defaults, not a user change: the page fetches what it draws itself
+        self.cancel()
+        self._cancel = cancel = threading.Event()
+        cid = get_correlation_id()
+        pool = _get_executor()
+
+        def _run(name, fn, *args):
+            if cancel.is_set():
+                return None
+            set_correlation_id(cid)
+            try:
+                with span("prefetch", target=name):  # failures are recorded as the span status
+                    return fn(*args)
+            except Exception:
+                return None  # speculative: the map render refetches geometries and surfaces errors
+
+        if egids:
+            self._futures.append(pool.submit(_run, "geometry", get_buildings_by_egid, list(egids)))
+        if industry and industry != "None":
+            self._futures.append(pool.submit(
+                _run, "report_context", get_report_context, industry, organization, scenario, kpi_index,
+            ))
+
+
+def for_session(state) -> Prefetcher:
+    """The Prefetcher stored in Streamlit's session state (created on first use)."""
+    if "_prefetcher" not in state:
+        state["_prefetcher"] = Prefetcher()
+    return state["_prefetcher"]
@@ -1,12 +1,23 @@
 # rag_engine.py
+from telemetry import timed
 
-def run_rag_pipeline(payload: dict):
+
+@timed("rag_pipeline")
+def run_rag_pipeline(payload: dict, progress=None):
     """
     Receives the payload from the Streamlit page and prints it.
     Later, this will trigger the actual RAG logic.
+    `progress(fraction, message)` is provided when running as a background job.
     """
+    if progress is not None:
+        progress(0.1, "Payload received")
+    context = payload.get("prefetched_context")
+    if progress is not None and context is not None:
+        progress(0.5, f"Using prefetched retrieval context ({len(context.get('chunks', []))} chunks)")
     print("[rag_engine] Received payload:")
     for key, value in payload.items():
+        if key == "prefetched_context":
+            continue
         print(f"  {key}: {value}")
-
-
+    if progress is not None:
+        progress(1.0, "Done")
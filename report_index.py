@@ -0,0 +1,304 @@
+# report_index.py
+import datetime
+import json
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# ------------------------------------------------------------
+# Local full-text + metadata index over data/reports/<sector>/*.md
+# ------------------------------------------------------------
+REPORTS_DIR = Path("data") / "reports"
+INDEX_PATH = REPORTS_DIR / "report_index.sqlite3"
+
+# Report file names written by save_report_md: <YYYYmmdd_HHMMSS>__<sector>__<scenario>.md
+_FNAME_RE = re.compile(r"^(?P<ts>\d{8}_\d{6})__(?P<sector>.+?)__(?P<scenario>.*)\.md$")
+
+# Matches of an unfiltered full-text query that are BM25-ranked (most recently indexed first)
+SEARCH_CANDIDATES = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id              INTEGER PRIMARY KEY,
+    path            TEXT UNIQUE NOT NULL,
+    mtime           REAL,
+    created_at      TEXT,
+    sector          TEXT,
+    scenario        TEXT,
+    organization    TEXT,
+    category        TEXT,
+    date_start      TEXT,
+    date_end        TEXT,
+    model           TEXT,
+    prompt_version  TEXT,
+    sources         TEXT,
+    title           TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_reports_sector   ON reports(sector, created_at);
+CREATE INDEX IF NOT EXISTS ix_reports_scenario ON reports(scenario, created_at);
+CREATE INDEX IF NOT EXISTS ix_reports_org      ON reports(organization, created_at);
+CREATE INDEX IF NOT EXISTS ix_reports_created  ON reports(created_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(title, body, sources, tokenize='unicode61 remove_diacritics 2');
+"""
+
+_lock = threading.Lock()
+_conns: Dict[str, sqlite3.Connection] = {}
+
+
+def connect(db_path=INDEX_PATH) -> sqlite3.Connection:
+    """Shared connection per index file (WAL, schema created on first use)."""
+    key = str(Path(db_path).resolve())
+    with _lock:
+        conn = _conns.get(key)
+        if conn is None:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(key, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            _conns[key] = conn
+        return conn
+
+
+# Metadata only the caller of index_report knows; kept when a file is re-indexed without it
+_CALLER_METADATA = ("sector", "scenario", "organization", "category", "date_start", "date_end",
+                    "model", "prompt_version", "sources")
+
+
+def _title_of(md_text: str) -> str:
+    for line in md_text.splitlines():
+        if line.startswith("# "):
+            return line[2:].strip()
+    return ""
+
+
+def index_report(path, md_text: Optional[str] = None, *, sector: Optional[str] = None,
+                 scenario: Optional[str] = None, organization: Optional[str] = None,
+                 category: Optional[str] = None, date_start=None, date_end=None,
+                 model: Optional[str] = None, prompt_version: Optional[str] = None,
+                 sources: Optional[List[str]] = None, db_path=INDEX_PATH) -> int:
+    """
+    Insert (or replace) one report in the index. Called right after a report is saved.
+    Metadata not passed is taken from the existing row of the same file, else recovered
+    from the file name when possible.
+    """
+    path = Path(path).resolve()
+    if md_text is None:
+        md_text = path.read_text(encoding="utf-8")
+
+    meta = {"sector": sector, "scenario": scenario, "organization": organization, "category": category,
+            "date_start": date_start, "date_end": date_end, "model": model,
+            "prompt_version": prompt_version, "sources": sources}
+    conn = connect(db_path)
+    old = conn.execute("SELECT * FROM reports WHERE path = ?", (str(path),)).fetchone()
+    if old is not None:
+        for col in _CALLER_METADATA:
+            if meta[col] is None:
+                meta[col] = json.loads(old[col] or "[]") if col == "sources" else old[col]
+
+    m = _FNAME_RE.match(path.name)
+    created_at = None
+    if m:
+        try:
+            created_at = datetime.datetime.strptime(m["ts"], "%Y%m%d_%H%M%S").isoformat(sep=" ")
+        except ValueError:
+            pass  # impossible timestamp (e.g. month 13): file mtime below
+        meta["sector"] = meta["sector"] or path.parent.name  # folder keeps the collection slug
+        meta["scenario"] = meta["scenario"] or m["scenario"]
+    if created_at is None:
+        created_at = datetime.datetime.fromtimestamp(path.stat().st_mtime).isoformat(sep=" ", timespec="seconds")
+
+    sources = meta["sources"] or []
+    row = (
+        str(path), path.stat().st_mtime, created_at, meta["sector"],
+        None if meta["scenario"] is None else str(meta["scenario"]),
+        meta["organization"], meta["category"],
+        None if meta["date_start"] is None else str(meta["date_start"]),
+        None if meta["date_end"] is None else str(meta["date_end"]),
+        meta["model"], meta["prompt_version"], json.dumps(sources, ensure_ascii=False), _title_of(md_text),
+    )
+
+    with _lock, conn:
+        old = conn.execute("SELECT id FROM reports WHERE path = ?", (str(path),)).fetchone()
+        if old is not None:
+            conn.execute("DELETE FROM reports_fts WHERE rowid = ?", (old["id"],))
+            conn.execute("DELETE FROM reports WHERE id = ?", (old["id"],))
+        cur = conn.execute(
+            "INSERT INTO reports (path, mtime, created_at, sector, scenario, organization, category,"
+            " date_start, date_end, model, prompt_version, sources, title)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            row,
+        )
+        conn.execute(
+            "INSERT INTO reports_fts (rowid, title, body, sources) VALUES (?, ?, ?, ?)",
+            (cur.lastrowid, row[-1], md_text, " ".join(sources)),
+        )
+        return cur.lastrowid
+
+
+def sync_index(reports_dir=REPORTS_DIR, db_path=INDEX_PATH) -> int:
+    """
+    Incrementally index reports written outside save_report_md (or before the index existed):
+    only files that are new or whose mtime changed are (re)indexed; deleted files are dropped.
+    Returns the number of files (re)indexed.
+    """
+    conn = connect(db_path)
+    known = {r["path"]: (r["id"], r["mtime"]) for r in conn.execute("SELECT id, path, mtime FROM reports")}
+    on_disk = {str(p.resolve()): p for p in Path(reports_dir).glob("*/*.md")}
+
+    n = 0
+    for key, p in on_disk.items():
+        if key not in known or known[key][1] != p.stat().st_mtime:
+            index_report(p, db_path=db_path)  # keeps the metadata of an existing row
+            n += 1
+
+    # Rows of deleted files, and rows stored under a non-normalised path by older versions
+    gone = [known[k][0] for k in known.keys() - on_disk.keys()]
+    if gone:
+        with _lock, conn:
+            conn.executemany("DELETE FROM reports_fts WHERE rowid = ?", [(i,) for i in gone])
+            conn.executemany("DELETE FROM reports WHERE id = ?", [(i,) for i in gone])
+    return n
+
+
+def _query_terms(text: str):
+    """(terms, last_is_prefix): only the last term is prefix-matched (it may still be being typed)."""
+    terms = re.findall(r"\w+", text, flags=re.UNICODE)
+    return terms, bool(terms) and not text[-1:].isspace()
+
+
+def _fts_query(text: str) -> str:
+    """User text -> safe FTS5 query: every term quoted, AND-ed together, last one prefix-matched."""
+    terms, prefix = _query_terms(text)
+    quoted = ['"{}"'.format(t.replace('"', '""')) for t in terms]
+    if prefix:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _fold(word: str) -> str:
+    """Case- and accent-insensitive form, as the FTS tokenizer (unicode61 remove_diacritics) sees it."""
+    return "".join(c for c in unicodedata.normalize("NFKD", word.casefold()) if not unicodedata.combining(c))
+
+
+def _snippet(body: str, text: str, width: int = 12) -> str:
+    """
+    Around the first query term of `body`, matches in bold (like FTS5 snippet()). Built in Python:
+    snippet() re-expands a prefix term for every row, which costs ~1.5 ms per hit.
+    """
+    terms, prefix = _query_terms(text)
+    exact = {_fold(t) for t in (terms[:-1] if prefix else terms)}
+    last = _fold(terms[-1]) if prefix else None
+
+    def is_hit(word):
+        f = _fold(word)
+        return f in exact or (last is not None and f.startswith(last))
+
+    before, window = deque(maxlen=width // 4), []
+    words = re.finditer(r"\w+", body)
+    for w in words:
+        if is_hit(w.group()):
+            window = list(before) + [w]
+            break
+        before.append(w)
+    if not window:
+        return ""
+    for w in words:
+        if len(window) >= width:
+            break
+        window.append(w)
+
+    out, pos = [], window[0].start()
+    for w in window:
+        if is_hit(w.group()):
+            out.append(body[pos:w.start()] + "**" + w.group() + "**")
+            pos = w.end()
+    out.append(body[pos:window[-1].end()])
+    text_out = " ".join("".join(out).split())
+    return ("…" if window[0].start() > 0 else "") + text_out + ("…" if window[-1].end() < len(body.rstrip()) else "")
+
+
+def search_reports(query: str = "", *, sector: Optional[str] = None, scenario: Optional[str] = None,
+                   organization: Optional[str] = None, since: Optional[str] = None,
+                   limit: int = 20, db_path=INDEX_PATH) -> List[dict]:
+    """
+    Full-text search filtered by metadata; without `query`, newest reports first.
+
+    Reports share a template vocabulary, so common terms match nearly every row and ranking all
+    of them costs tens of ms. Unfiltered queries therefore BM25-rank only the SEARCH_CANDIDATES
+    most recently indexed matches; with a metadata filter the newest matches come first.
+    """
+    where, params = [], []
+    for col, val in (("r.sector", sector), ("r.scenario", scenario), ("r.organization", organization)):
+        if val not in (None, "", "None"):
+            where.append(f"{col} = ?")
+            params.append(str(val))
+    if since:
+        where.append("r.created_at >= ?")
+        params.append(str(since))
+
+    fts = _fts_query(query or "")
+    if fts and where:
+        sql = (
+            "WITH top AS (SELECT r.id, r.created_at FROM reports r WHERE " + " AND ".join(where)
+            + " AND r.id IN (SELECT rowid FROM reports_fts WHERE reports_fts MATCH ?)"
+            " ORDER BY r.created_at DESC LIMIT ?)"
+        )
+        order = "top.created_at DESC"
+        params = params + [fts, int(limit)]
+    elif fts:
+        sql = (
+            "WITH cand AS (SELECT rowid AS id, bm25(reports_fts) AS score FROM reports_fts"
+            " WHERE reports_fts MATCH ? ORDER BY rowid DESC LIMIT ?),"
+            " top AS (SELECT id, score FROM cand ORDER BY score LIMIT ?)"
+        )
+        order = "top.score"
+        params = [fts, SEARCH_CANDIDATES, int(limit)]
+    if fts:
+        sql += f" SELECT r.* FROM top JOIN reports r ON r.id = top.id ORDER BY {order}"
+    else:
+        sql = (
+            "SELECT r.*, '' AS snippet FROM reports r"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY r.created_at DESC LIMIT ?"
+        )
+        params.append(int(limit))
+
+    conn = connect(db_path)
+    rows = conn.execute(sql, params).fetchall()
+    bodies = {}
+    if fts and rows:
+        # One rowid lookup for the bodies of the rows shown; snippets are cut in Python
+        ids = [r["id"] for r in rows]
+        bodies = dict(conn.execute(
+            f"SELECT rowid, body FROM reports_fts WHERE rowid IN ({', '.join('?' * len(ids))})", ids,
+        ).fetchall())
+    out = []
+    for r in rows:
+        d = dict(r)
+        d["sources"] = json.loads(d["sources"] or "[]")
+        if fts:
+            d["snippet"] = _snippet(bodies.get(d["id"]) or "", query)
+        out.append(d)
+    return out
+
+
+def get_report_text(report_id: int, db_path=INDEX_PATH) -> Optional[str]:
+    """Stored Markdown body of an indexed report (no filesystem access)."""
+    row = connect(db_path).execute("SELECT body FROM reports_fts WHERE rowid = ?", (report_id,)).fetchone()
+    return None if row is None else row["body"]
+
+
+def distinct_values(column: str, db_path=INDEX_PATH) -> List[str]:
+    """Values available for a metadata filter (sector / scenario / organization)."""
+    if column not in ("sector", "scenario", "organization"):
+        raise ValueError(f"Unsupported filter column '{column}'.")
+    rows = connect(db_path).execute(
+        f"SELECT DISTINCT {column} FROM reports WHERE {column} IS NOT NULL ORDER BY {column}"
+    ).fetchall()
+    return [r[0] for r in rows]
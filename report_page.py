@@ -3,15 +3,27 @@ import time
 import json
 import logging
 import sys
+import threading
+from pathlib import Path
+
 import streamlit as st
-from rag_engine import run_rag_pipeline
+from report_index import distinct_values, get_report_text, search_reports, sync_index
+from job_queue import CANCELLED, DONE, FAILED, QUEUED, RUNNING, cancel, ensure_workers, get_job, submit
+from prefetcher import peek_report_context
+from telemetry import get_correlation_id
+
+# Seconds between two status polls while a report job is queued / running
+JOB_POLL_SECONDS = 1.0
+# Seconds between two background re-syncs of the report index with data/reports (per server process)
+INDEX_SYNC_SECONDS = 600
 
 # -----------------------------------------------------------------------------
 # Navigation helper
-# - We first try to import your app's go(); if not available, we provide a local fallback.
+# - We first try the shared router's go(); if not available, we provide a local fallback.
+#   (Importing `app` here would re-execute the whole main script.)
 # -----------------------------------------------------------------------------
 try:
-    from app import go as _app_go  # adjust to your main module if needed (e.g., streamlit_app)
+    from page_router import go as _app_go
 except Exception:
     _app_go = None
 
@@ -35,121 +47,83 @@ def go(page: str, **params):
 
 
 # -----------------------------------------------------------------------------
-# Eco-themed animated loading screen
+# Past reports: search / filter / reuse through the local report index
 # -----------------------------------------------------------------------------
-def render_loading_screen(estimated_seconds: int = 24, work_fn=None, *args, **kwargs):
+@st.cache_resource(ttl=INDEX_SYNC_SECONDS, show_spinner=False)
+def _start_index_sync() -> threading.Thread:
     """
-    Eco-themed full-screen overlay loader that:
-    - Covers the entire viewport (no underlying page visible)
-    - Runs `work_fn(*args, **kwargs)` while the overlay is visible
-    - Updates the step line to "Rapport généré" on completion
-    - Removes the overlay before returning
+    Pick up report files written outside save_report_md (stat() of every file: ~1 s at 20k reports).
+    Save-time indexing keeps the index current, so this runs once per server process and TTL,
+    in the background, never in a page render.
     """
-
-    # One placeholder to own the overlay so we can remove it later
-    overlay = st.empty()
-
-    # Inject CSS + HTML overlay (full screen, fixed, high z-index)
-    overlay.markdown(
-        """
-        <style>
-        /* Make the whole app dark to avoid any flicker on repaint */
-        html, body { background: #0A0D0A !important; }
-        [data-testid="stAppViewContainer"] { background: #0A0D0A !important; }
-        [data-testid="stHeader"], header[role="banner"] { display: none !important; }
-        /* Hide the sidebar so nothing peeks from the left */
-        [data-testid="stSidebar"] { display: none !important; }
-
-        /* Full-screen overlay */
-        #eco-overlay {
-          position: fixed;
-          inset: 0;                 /* top:0; right:0; bottom:0; left:0 */
-          background: #0A0D0A;
-          display: flex;
-          flex-direction: column;
-          align-items: center;
-          justify-content: center;
-          z-index: 999999;          /* above everything Streamlit renders */
-        }
-
-        .eco-spinner {
-          width: 120px;
-          height: 120px;
-          border: 8px solid rgba(46, 204, 113, 0.18);
-          border-top-color: #2ECC71;
-          border-right-color: rgba(46,204,113,0.28);
-          border-radius: 50%;
-          animation: spin 1.05s linear infinite;
-          box-shadow: 0 0 30px rgba(46, 204, 113, 0.25),
-                      inset 0 0 8px rgba(46, 204, 113, 0.12);
-        }
-
-        .step-line {
-          margin-top: 12px;
-          font-size: 1.75rem;
-          font-weight: 600;
-          color: #A5D6A7;
-          text-align: center;
-          letter-spacing: 0.2px;
-        }
-
-        @keyframes spin { to { transform: rotate(360deg); } }
-        </style>
-
-        <div id="eco-overlay">
-          <div class="eco-spinner"></div>
-          <div id="eco-step" class="step-line">
-            PrismAI génère votre rapport stratégique, en toute confidentialité
-          </div>
-        </div>
-        """,
-        unsafe_allow_html=True,
+    thread = threading.Thread(target=sync_index, name="prismai-report-index-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+def render_report_library():
+    st.subheader("🔎 Past reports")
+    _start_index_sync()
+
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        query = st.text_input("Search reports", key="report_search_query",
+                              placeholder="e.g. chauffage, OSTRAL, UNI Mail…")
+    with col2:
+        sector = st.selectbox("Sector", options=["All"] + distinct_values("sector"), key="report_search_sector")
+    with col3:
+        scenario = st.selectbox("Scenario (%)", options=["All"] + distinct_values("scenario"),
+                                key="report_search_scenario")
+
+    hits = search_reports(
+        query,
+        sector=None if sector == "All" else sector,
+        scenario=None if scenario == "All" else scenario,
+        limit=25,
     )
-
-    # ---- Run the heavy work while the overlay is on screen ----
-    result = None
-    t0 = time.time()
-    if work_fn is not None:
-        try:
-            result = work_fn(*args, **kwargs)
-        finally:
-            elapsed = int(time.time() - t0)
-            # Optional: keep the overlay briefly if your estimate is longer
-            # to avoid a jarring instant jump
-            pad = max(0, (estimated_seconds or 0) - elapsed)
-            if pad:
-                time.sleep(min(pad, 1))  # cap padding so it doesn't feel artificial
-
-    # Show completion message very briefly (keeps the UX crisp)
-    overlay.markdown(
-        """
-        <div id="eco-overlay">
-          <div class="eco-spinner"></div>
-          <div id="eco-step" class="step-line">Rapport généré</div>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
-    time.sleep(0.25)
-
-    # Remove overlay so the next view (or navigation) is fully visible
-    overlay.empty()
-    return result
+    if not hits:
+        st.caption("No report matches these filters.")
+        return
+
+    # Only metadata + snippet per hit; the body is fetched once, for the report being reused
+    for hit in hits:
+        label = f"{hit['created_at']} — {hit['title'] or hit['path']}"
+        with st.expander(label):
+            meta = {k: hit[k] for k in ("sector", "scenario", "organization", "date_start", "date_end",
+                                        "model", "prompt_version") if hit.get(k)}
+            st.caption(" · ".join(f"{k}: {v}" for k, v in meta.items()))
+            if hit["snippet"]:
+                st.markdown(f"> {hit['snippet']}")
+            if st.button("Reuse this report", key=f"reuse_report_{hit['id']}"):
+                st.session_state["report_result"] = get_report_text(hit["id"])
+                st.session_state["report_result_name"] = Path(hit["path"]).name
+                st.rerun()
+
+
+def render_report_result():
+    """The generated (or reused) Markdown report kept in `report_result`, if any."""
+    md_text = st.session_state.get("report_result")
+    if not isinstance(md_text, str) or not md_text:
+        return
+    st.subheader("📄 Report")
+    st.download_button("Download Markdown", md_text, mime="text/markdown",
+                       file_name=st.session_state.get("report_result_name", "report.md"))
+    st.markdown(md_text)
 
 
 # -----------------------------------------------------------------------------
 # Render page: consume prior form data, print to terminal, show loader
 # -----------------------------------------------------------------------------
 def render():
-    # 1) Get payload from previous page's form (preferred)
+    # 1) Get payload from previous page's form (preferred), else from the map page selection
     payload = st.session_state.get("report_params", {}).copy()
+    for key in ("industry", "organization", "reduction_supply", "reduction_start", "reduction_end"):
+        if key in st.session_state:
+            payload.setdefault(key, st.session_state[key])
 
-    # Timestamp for logging
+    # Timestamp + correlation ID for logging
     payload.setdefault("timestamp", time.strftime("%Y-%m-%d %H:%M:%S"))
-
-    # -------- Print to terminal (stdout + logging) --------
-    print("[report_page] Received form payload:")
-    print(json.dumps(payload, ensure_ascii=False, indent=2))
+    payload.setdefault("correlation_id", get_correlation_id())
 
     logger = logging.getLogger("report_page")
     if not logger.handlers:
@@ -158,18 +132,67 @@ def render():
         logger.addHandler(handler)
         logger.setLevel(logging.INFO)
 
-    # -------- Show the animated eco loading screen WHILE generating the report --------
-    # This will display the loader immediately, then run the RAG pipeline.
-    result = render_loading_screen(
-        estimated_seconds=4,
-        work_fn=run_rag_pipeline,
-        payload=payload
-    )
-
-    # Optionally keep the result for the next page
-    if result is not None:
-        st.session_state["report_result"] = result
+    # -------- Submit the report as a background job (survives refreshes via ?job=...) --------
+    ensure_workers()
+    job_id = st.session_state.get("report_job_id") or st.query_params.get("job")
+    if not job_id:
+        logger.info("Submitting report job: %s", json.dumps(payload, ensure_ascii=False, default=str))
+        # Retrieval + KPI context warmed on the map page, attached only if already computed. The job
+        # does not retrieve when it is absent: run_rag_pipeline is still a stub that only reports it.
+        prefetched = peek_report_context(payload.get("industry"), payload.get("organization"),
+                                         payload.get("reduction_supply"))
+        if prefetched is not None:
+            payload["prefetched_context"] = prefetched
+        job_id = submit("report", payload)
+    st.session_state["report_job_id"] = job_id
+    st.query_params["job"] = job_id
+
+    job = get_job(job_id)
+    if job is None:
+        st.error(f"Unknown report job '{job_id}'.")
+        _forget_job()
+        return
+
+    st.title("📝 Report generation")
+    if job["status"] in (QUEUED, RUNNING):
+        label = job["message"] or ("Waiting for a free worker…" if job["status"] == QUEUED else "Generating…")
+        st.progress(min(max(job["progress"] or 0.0, 0.0), 1.0), text=label)
+        if st.button("Cancel", key="cancel_report_job"):
+            cancel(job_id)
+        # Poll: rerun the page until the job reaches a final state
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
+    if job["status"] == DONE:
+        # Keep the result for the next page, once per job: later reruns must not overwrite a reused report
+        if job["result"] is not None and st.session_state.get("report_result_job_id") != job_id:
+            st.session_state["report_result"] = job["result"]
+            st.session_state.pop("report_result_name", None)
+            st.session_state["report_result_job_id"] = job_id
+        st.success("Report generated.")
+    elif job["status"] == FAILED:
+        st.error("Report generation failed.")
+        with st.expander("Details"):
+            st.code(job["error"] or "")
+    elif job["status"] == CANCELLED:
+        st.warning("Report generation cancelled.")
+
+    if st.button("New report", key="new_report_job"):
+        _forget_job()
+        st.rerun()
+
+    render_report_result()
+    render_report_library()
 
     # -------- Navigate or display result --------
     # Uncomment if you want to jump to another logical page after generation:
     # go("map")  # example
+
+
+def _forget_job():
+    st.session_state.pop("report_job_id", None)
+    st.session_state.pop("report_result", None)
+    st.session_state.pop("report_result_name", None)
+    st.session_state.pop("report_result_job_id", None)
+    if "job" in st.query_params:
+        del st.query_params["job"]
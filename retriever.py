@@ -0,0 +1,129 @@
+# retriever.py
+import threading
+from pathlib import Path
+
+from telemetry import span
+from vector_snapshot import open_snapshot
+
+# ------------------------------------------------------------
+# Sector retrieval shared by the report script and the app-side prefetcher.
+# chromadb / sentence-transformers are imported on first use only.
+# ------------------------------------------------------------
+DATA_ROOT = Path("data")
+PERSIST_ROOT = DATA_ROOT / "chroma_dbs"
+SNAPSHOT_ROOT = DATA_ROOT / "vector_snapshots"
+
+# Chroma collections (created during ingestion)
+COLLECTION_SLUGS = {
+    "education": "education",
+    "healthcare": "healthcare",
+    "private_sector": "private_sector",
+    "state": "state",
+}
+
+# `category` of buildings_cleaned.csv -> knowledge-base sector
+INDUSTRY_TO_SECTOR = {
+    "Health": "healthcare",
+    "Education": "education",
+    "R&D": "education",
+    "Administration": "state",
+}
+
+# Embedding model used at ingestion time (keep identical)
+EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+TOP_K = 6
+
+
+def sector_for_industry(industry: str) -> str:
+    if not industry:
+        return "private_sector"
+    if industry.lower() in COLLECTION_SLUGS:
+        return industry.lower()
+    return INDUSTRY_TO_SECTOR.get(industry, "private_sector")
+
+
+def default_question(scenario) -> str:
+    return f"Atteindre {scenario}% de réduction sans perturber les cours ni la sécurité des élèves."
+
+
+def build_query(question: str, sc_text: str, law_provided: bool = False) -> str:
+    """Concise retrieval query (the model context will include richer blocks)."""
+    return f"{question}\nScénario: {sc_text}\nRéférences légales: {('fourni' if law_provided else 'non fourni')}"
+
+
+def query_collection(col, embed_fn, sector: str, q: str, top_k: int = TOP_K) -> list:
+    """[(document, metadata, distance), …] for query `q` on a Chroma collection or VectorSnapshot."""
+    # Embed explicitly so embedding and ANN search show up as separate spans
+    with span("embedding", model=EMBED_MODEL):
+        q_emb = embed_fn([q])
+    with span("chroma_query", sector=sector, top_k=top_k):
+        out = col.query(
+            query_embeddings=q_emb,
+            n_results=top_k,
+            include=["documents", "metadatas", "distances"],
+        )
+    docs = out.get("documents", [[]])[0]
+    metas = out.get("metadatas", [[]])[0]
+    dists = out.get("distances", [[]])[0]
+    return list(zip(docs, metas, dists))
+
+
+# ------------------------------------------------------------
+# Lazily opened, process-wide handles
+# ------------------------------------------------------------
+_lock = threading.Lock()
+_embedding_fn = None
+_collections = {}
+
+
+def get_embedding_fn():
+    global _embedding_fn
+    with _lock:
+        if _embedding_fn is None:
+            from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+            _embedding_fn = SentenceTransformerEmbeddingFunction(model_name=EMBED_MODEL)
+        return _embedding_fn
+
+
+def open_collection(slug: str, embedding_fn=None):
+    import chromadb
+    try:
+        from chromadb.config import Settings
+    except Exception:
+        from chromadb import Settings
+
+    persist_dir = PERSIST_ROOT / slug
+    if not persist_dir.exists():
+        raise FileNotFoundError(f"Chroma persist dir not found: {persist_dir}")
+    client = chromadb.Client(Settings(
+        anonymized_telemetry=False,
+        allow_reset=True,
+        is_persistent=True,
+        persist_directory=str(persist_dir),
+    ))
+    return client.get_collection(name=slug, embedding_function=embedding_fn)
+
+
+def get_collection(sector: str):
+    """Memory-mapped snapshot when exported and up to date (python vector_snapshot.py), Chroma client otherwise."""
+    if sector not in COLLECTION_SLUGS:
+        raise ValueError(f"Unknown sector '{sector}'. Choose among {list(COLLECTION_SLUGS)}.")
+    with _lock:
+        col = _collections.get(sector)
+    if col is None:
+        slug = COLLECTION_SLUGS[sector]
+        col = open_snapshot(slug, snapshot_root=SNAPSHOT_ROOT) or open_collection(slug, get_embedding_fn())
+        with _lock:
+            col = _collections.setdefault(sector, col)
+    return col
+
+
+def retrieve(sector: str, question: str, sc_text: str, top_k: int = TOP_K, law_provided: bool = False) -> dict:
+    """Same shape as the report script's `retrieve_topk` payload."""
+    q = build_query(question, sc_text, law_provided)
+    return {
+        "sector": sector,
+        "scenario": sc_text,
+        "question": question,
+        "chunks": query_collection(get_collection(sector), get_embedding_fn(), sector, q, top_k),
+    }
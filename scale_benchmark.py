@@ -0,0 +1,153 @@
+# scale_benchmark.py
+import argparse
+import datetime
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from energy_data import add_pct_deviation, aggregate_energy, select_egids
+from kpi_engine import ENERGY_COLS, build_kpi_table, clean_energy_data
+from synthetic_data import fake_sitg_chunks, generate_dataset, write_dataset
+
+# ------------------------------------------------------------
+# Scaling benchmark for the data and map paths of app.py
+#
+#   python scale_benchmark.py                          # 10k + 100k buildings
+#   python scale_benchmark.py --scales 10000 1000000   # up to canton scale
+#
+# Every run is appended to data/benchmarks/history.jsonl with the current git commit;
+# a step slower than `--threshold` × its last timing on another commit is a regression
+# (exit status 1 with --fail-on-regression).
+# ------------------------------------------------------------
+HISTORY = Path("data") / "benchmarks" / "history.jsonl"
+DEFAULT_SCALES = (10_000, 100_000)
+STEPS = ("load", "clean", "aggregate", "pct_deviation", "egid_flatten", "kpi_build", "geojson_assembly")
+MIN_REGRESSION_MS = 5.0  # ignore noise on very fast steps
+
+
+def _best_of(fn, repeat: int):
+    """(best seconds, last result) over `repeat` runs."""
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def git_commit() -> str:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True).stdout.strip()
+        return f"{sha}-dirty" if dirty else sha
+    except Exception:
+        return "unknown"
+
+
+def run_scale(n_buildings: int, steps=STEPS, repeat: int = 3, seed: int = 0) -> dict:
+    """Time every step on a synthetic dataset of `n_buildings`; returns {step: seconds}."""
+    ds = generate_dataset(n_buildings, seed=seed)
+    timings = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dataset(ds, tmp)
+        if "load" in steps:
+            timings["load"], (buildings, general_data) = _best_of(
+                lambda: (pd.read_csv(Path(tmp) / "buildings_cleaned.csv"), pd.read_csv(Path(tmp) / "data_raw.csv")),
+                repeat,
+            )
+        else:
+            buildings, general_data = ds["buildings"], ds["general_data"]
+
+    gdf = clean_energy_data(general_data)
+    if "clean" in steps:
+        timings["clean"], gdf = _best_of(lambda: clean_energy_data(general_data), repeat)
+
+    some_org = buildings["nom"].iloc[len(buildings) // 2]
+    some_ind = buildings["category"].iloc[0]
+    if "aggregate" in steps:
+        timings["aggregate"], _ = _best_of(
+            lambda: (aggregate_energy(gdf, org=some_org), aggregate_energy(gdf, ind=some_ind), aggregate_energy(gdf)),
+            repeat,
+        )
+    if "pct_deviation" in steps:
+        timings["pct_deviation"], _ = _best_of(lambda: add_pct_deviation(gdf, cols=ENERGY_COLS), repeat)
+    if "egid_flatten" in steps:
+        timings["egid_flatten"], _ = _best_of(lambda: select_egids(buildings), repeat)
+    if "kpi_build" in steps:
+        timings["kpi_build"], _ = _best_of(lambda: build_kpi_table(general_data, buildings), repeat)
+    if "geojson_assembly" in steps:
+        from sitg_map_component import assemble_feature_collection
+
+        chunks = fake_sitg_chunks(ds["egids"], seed=seed)
+        timings["geojson_assembly"], _ = _best_of(lambda: json.dumps(assemble_feature_collection(chunks)), repeat)
+    return timings
+
+
+def load_history(path=HISTORY) -> list:
+    path = Path(path)
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def find_regressions(records: list, history: list, threshold: float) -> list:
+    """Compare each new record with the latest one of the same scale/step from another commit."""
+    regressions = []
+    for rec in records:
+        previous = [h for h in history
+                    if h["scale"] == rec["scale"] and h["step"] == rec["step"] and h["commit"] != rec["commit"]]
+        if not previous:
+            continue
+        ref = previous[-1]
+        slower_ms = (rec["seconds"] - ref["seconds"]) * 1000.0
+        if rec["seconds"] > ref["seconds"] * threshold and slower_ms > MIN_REGRESSION_MS:
+            regressions.append((rec, ref))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark data/map paths on synthetic datasets.")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES))
+    parser.add_argument("--steps", nargs="+", choices=STEPS, default=list(STEPS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=1.3, help="slowdown ratio flagged as regression")
+    parser.add_argument("--history", default=str(HISTORY))
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    stamp = datetime.datetime.now().isoformat(timespec="seconds")
+    records = []
+    for n in args.scales:
+        timings = run_scale(n, steps=args.steps, repeat=args.repeat)
+        for step, seconds in timings.items():
+            records.append({"commit": commit, "timestamp": stamp, "scale": n, "step": step,
+                            "seconds": round(seconds, 6)})
+            print(f"{n:>9,} buildings  {step:<17} {seconds * 1000:10.1f} ms")
+
+    regressions = find_regressions(records, load_history(args.history), args.threshold)
+    for rec, ref in regressions:
+        print(f"✗ regression: {rec['step']} @ {rec['scale']:,}: {rec['seconds'] * 1000:.1f} ms "
+              f"vs {ref['seconds'] * 1000:.1f} ms on {ref['commit']}")
+
+    if not args.no_save:
+        path = Path(args.history)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec) + "\n")
+
+    return 1 if (regressions and args.fail_on_regression) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
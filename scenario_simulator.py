@@ -0,0 +1,204 @@
+# scenario_simulator.py
+import datetime as dt
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from kpi_engine import ENERGY_COLS, clean_energy_data
+
+# ------------------------------------------------------------
+# Batch what-if simulator
+#
+# A scenario = (reduction target, date window, carrier mix). For every organisation of
+# buildings_cleaned.csv with energy rows the expected saving is
+#     target × share of the yearly consumption falling in the window × mix weight × baseline kWh
+# per carrier, evaluated for all scenarios at once with a single matrix product.
+# Organisations are grouped by their Clean_Data category, like the KPI layer and the charts.
+# ------------------------------------------------------------
+
+# kg CO₂-eq per kWh final energy (order of magnitude of Swiss KBOB factors; adjust as needed)
+EMISSION_FACTORS = {
+    "kwh_electrique": 0.128,
+    "kwh_gaz": 0.228,
+    "kwh_cad": 0.100,
+    "kwh_mazout": 0.301,
+}
+
+# Relative monthly load per carrier (Jan..Dec). Heating carriers follow Geneva heating degree days.
+_HEATING = [0.165, 0.140, 0.115, 0.075, 0.035, 0.010, 0.005, 0.005, 0.025, 0.070, 0.145, 0.210]
+MONTHLY_PROFILE = {
+    "kwh_electrique": [0.090, 0.085, 0.086, 0.080, 0.080, 0.078, 0.076, 0.070, 0.080, 0.085, 0.090, 0.100],
+    "kwh_gaz": _HEATING,
+    "kwh_cad": _HEATING,
+    "kwh_mazout": _HEATING,
+}
+
+# Named carrier mixes: share of the target applied to each carrier
+CARRIER_MIXES = {
+    "All carriers": {"kwh_electrique": 1.0, "kwh_gaz": 1.0, "kwh_cad": 1.0, "kwh_mazout": 1.0},
+    "Electricity only": {"kwh_electrique": 1.0},
+    "Heating only": {"kwh_gaz": 1.0, "kwh_cad": 1.0, "kwh_mazout": 1.0},
+    "Fossil heating only": {"kwh_gaz": 1.0, "kwh_mazout": 1.0},
+}
+
+
+def _daily_cumulative(profile: dict, carriers: list, leap: bool) -> np.ndarray:
+    """(C, days in year + 1) cumulative share of one calendar year's load (ends at exactly 1)."""
+    year = 2000 if leap else 2001
+    days = pd.date_range(f"{year}-01-01", f"{year}-12-31", freq="D")
+    month_len = days.month.value_counts().sort_index().to_numpy()
+    out = np.zeros((len(carriers), len(days) + 1))
+    for i, c in enumerate(carriers):
+        w = np.asarray(profile.get(c, [1.0 / 12] * 12), dtype=float)
+        daily = (w / w.sum() / month_len)[days.month - 1]
+        out[i, 1:] = np.cumsum(daily)
+    return out
+
+
+def _to_day(x) -> np.ndarray:
+    return np.asarray(x, dtype="datetime64[D]")
+
+
+def scenario_grid(targets, windows, mixes) -> dict:
+    """
+    Cartesian product of targets (%), date windows [(start, end), …] and carrier mixes
+    (names of CARRIER_MIXES or {carrier: weight} dicts) as flat arrays for `run`.
+    """
+    rows = list(itertools.product(targets, windows, mixes))
+    return {
+        "targets": np.array([t for t, _, _ in rows], dtype=float),
+        "starts": _to_day([w[0] for _, w, _ in rows]),
+        "ends": _to_day([w[1] for _, w, _ in rows]),
+        "mixes": [m for _, _, m in rows],
+    }
+
+
+class ScenarioSimulator:
+    """
+    Holds the per-organisation baseline (kWh/year per carrier) and evaluates scenario batches.
+    `baseline="latest"` uses each organisation's most recent year, `"mean"` the average year.
+    """
+
+    def __init__(self, buildings: pd.DataFrame, general_data: pd.DataFrame, baseline: str = "latest",
+                 emission_factors: dict = None, monthly_profile: dict = None):
+        df = clean_energy_data(general_data)
+        self.carriers = [c for c in ENERGY_COLS if c in df.columns]
+
+        # Organisations of buildings_cleaned.csv, categorised as in Clean_Data (one source with the KPIs)
+        df = df[df["nom"].isin(buildings["nom"])]
+        orgs = df.sort_values("annee").groupby("nom")["category"].last().dropna()
+        if baseline == "latest":
+            base = df.sort_values("annee").groupby("nom")[self.carriers].last()
+        elif baseline == "mean":
+            base = df.groupby("nom")[self.carriers].mean()
+        else:
+            raise ValueError(f"Unknown baseline '{baseline}'. Choose 'latest' or 'mean'.")
+
+        self.organisations = orgs.index.to_numpy()
+        self.categories = orgs.to_numpy()
+        # (O, C) baseline kWh/year; missing carriers contribute 0
+        self.baseline = base.reindex(self.organisations).fillna(0.0).to_numpy(dtype=float)
+
+        ef = emission_factors or EMISSION_FACTORS
+        self.emission_factors = np.array([ef.get(c, 0.0) for c in self.carriers])
+        self.baseline_co2 = self.baseline * self.emission_factors  # (O, C) kg CO₂/year
+
+        self.category_names, cat_idx = np.unique(self.categories, return_inverse=True)
+        self.category_matrix = np.zeros((len(self.organisations), len(self.category_names)))
+        self.category_matrix[np.arange(len(self.organisations)), cat_idx] = 1.0  # (O, K) one-hot
+
+        profile = monthly_profile or MONTHLY_PROFILE
+        self._cum = {False: _daily_cumulative(profile, self.carriers, leap=False),
+                     True: _daily_cumulative(profile, self.carriers, leap=True)}
+
+    def mix_matrix(self, mixes) -> np.ndarray:
+        """(S, C) carrier weights; identical mixes are resolved only once."""
+        cache, rows = {}, []
+        for m in mixes:
+            key = m if isinstance(m, str) else tuple(sorted(m.items()))
+            if key not in cache:
+                weights = CARRIER_MIXES[m] if isinstance(m, str) else m
+                cache[key] = np.array([float(weights.get(c, 0.0)) for c in self.carriers])
+            rows.append(cache[key])
+        return np.vstack(rows) if rows else np.zeros((0, len(self.carriers)))
+
+    def window_shares(self, starts, ends) -> np.ndarray:
+        """
+        (S, C) share of the yearly consumption of each carrier inside [start, end] (inclusive),
+        summed per calendar year so each year counts at most once (leap years have 366 days).
+        """
+        starts, ends = _to_day(starts), _to_day(ends)
+        if (ends < starts).any():
+            raise ValueError("Every window must end on or after its start.")
+        first_year = starts.astype("datetime64[Y]")
+        n_years = (ends.astype("datetime64[Y]") - first_year).astype(int) + 1
+        shares = np.zeros((len(starts), len(self.carriers)))
+        for k in range(int(n_years.max()) if len(starts) else 0):
+            year = first_year + k
+            jan1, next_jan1 = year.astype("datetime64[D]"), (year + 1).astype("datetime64[D]")
+            lo = (np.maximum(starts, jan1) - jan1).astype(int)            # first day in this year
+            hi = (np.minimum(ends + 1, next_jan1) - jan1).astype(int)     # exclusive end
+            leap = (next_jan1 - jan1).astype(int) == 366
+            for is_leap in (False, True):
+                rows = np.flatnonzero((k < n_years) & (leap == is_leap))
+                if len(rows):
+                    cum = self._cum[is_leap]
+                    shares[rows] += (cum[:, hi[rows]] - cum[:, lo[rows]]).T
+        return shares
+
+    def run(self, targets, starts, ends, mixes, per_carrier: bool = False) -> dict:
+        """
+        Evaluate S scenarios at once. `targets` are in % (e.g. 10, 20, 30).
+        Returns (S × O) and (S × K) arrays of saved kWh and kg CO₂, plus the scenario factors;
+        `per_carrier=True` adds the (S × O × C) breakdown (memory grows with S × O).
+        """
+        targets = np.asarray(targets, dtype=float) / 100.0
+        factors = targets[:, None] * self.window_shares(starts, ends) * self.mix_matrix(mixes)  # (S, C)
+
+        kwh_org = factors @ self.baseline.T         # (S, O)
+        co2_org = factors @ self.baseline_co2.T     # (S, O)
+        result = {
+            "factors": factors,
+            "kwh_by_org": kwh_org,
+            "co2_kg_by_org": co2_org,
+            "kwh_by_category": kwh_org @ self.category_matrix,
+            "co2_kg_by_category": co2_org @ self.category_matrix,
+        }
+        if per_carrier:
+            result["kwh_by_carrier"] = factors[:, None, :] * self.baseline[None, :, :]  # (S, O, C)
+        return result
+
+    def run_grid(self, targets, windows, mixes, per_carrier: bool = False) -> dict:
+        grid = scenario_grid(targets, windows, mixes)
+        result = self.run(grid["targets"], grid["starts"], grid["ends"], grid["mixes"], per_carrier=per_carrier)
+        result["grid"] = grid
+        return result
+
+    def to_frame(self, result: dict, by: str = "organisation") -> pd.DataFrame:
+        """Long table (one row per scenario × organisation or category) for display/export."""
+        grid = result["grid"]
+        if by == "organisation":
+            names, kwh, co2 = self.organisations, result["kwh_by_org"], result["co2_kg_by_org"]
+        elif by == "category":
+            names, kwh, co2 = self.category_names, result["kwh_by_category"], result["co2_kg_by_category"]
+        else:
+            raise ValueError(f"Unknown grouping '{by}'. Choose 'organisation' or 'category'.")
+        n_s, n_n = kwh.shape
+        mix_labels = [m if isinstance(m, str) else "custom" for m in grid["mixes"]]
+        return pd.DataFrame({
+            "target_pct": np.repeat(grid["targets"], n_n),
+            "start": np.repeat(grid["starts"], n_n),
+            "end": np.repeat(grid["ends"], n_n),
+            "mix": np.repeat(np.asarray(mix_labels, dtype=object), n_n),
+            by: np.tile(names, n_s),
+            "saved_kwh": kwh.ravel(),
+            "saved_co2_t": co2.ravel() / 1000.0,
+        })
+
+
+def rolling_windows(start: dt.date, end: dt.date, lengths_days=(7, 30, 90)) -> list:
+    """Windows of several lengths starting at `start`, plus the [start, end] window itself."""
+    windows = [(start, end)]
+    windows += [(start, start + dt.timedelta(days=n - 1)) for n in lengths_days]
+    return list(dict.fromkeys(windows))
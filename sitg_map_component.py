@@ -3,12 +3,23 @@ import requests
 import streamlit as st
 from streamlit_folium import st_folium
 import folium
+from telemetry import span
+from tile_proxy import attribution, tile_url
+from prefetcher import get_buildings_by_egid
 
 # ------------------------------------------------------------
 # SITG CADASTRE — Bâtiments hors-sol (polygons)
 # ------------------------------------------------------------
 SITG_BUILDINGS_QUERY = "https://thematic.sitg.ge.ch/arcgis/rest/services/CADASTRE/FeatureServer/47/query"
 
+def assemble_feature_collection(chunks) -> dict:
+    """Merge the GeoJSON FeatureCollections returned per IN-clause chunk into one collection."""
+    features = []
+    for chunk_fc in chunks:
+        features.extend(chunk_fc.get("features", []))
+    return {"type": "FeatureCollection", "features": features}
+
+
 def fetch_buildings_by_egid(egids, chunk_size=900, timeout=20):
     """
     Fetch building polygons for the given EGID list from SITG (layer 47).
@@ -16,33 +27,27 @@ def fetch_buildings_by_egid(egids, chunk_size=900, timeout=20):
     - Handles IN-clause chunking (ArcGIS often caps ~1000 items per request).
     - Requests geometry + all attributes (you can trim outFields if you want).
     """
-    
-    egids_str=str(egids).replace('[','').replace(']','')
-
     if not egids:
         return {"type": "FeatureCollection", "features": []}
 
-    features = []
-    for i in range(0, len(egids), chunk_size):
-        # chunk = egids[i:i+chunk_size]
-        if not egids_str:
-            continue
-        where = f"EGID IN ({egids_str})"  # EGID is numeric in this layer
-        params = {
-            "f": "geojson",
-            "where": where,
-            "returnGeometry": "true",
-            "outFields": "*",
-            "inSR": 4326,
-            "outSR": 4326,              # reproject to WGS84 for Leaflet
-            "geometryPrecision": 6,     # smaller payload; adjust if you need more detail
-        }
-        r = requests.get(SITG_BUILDINGS_QUERY, params=params, timeout=timeout)
-        r.raise_for_status()
-        chunk_fc = r.json()
-        features.extend(chunk_fc.get("features", []))
+    def _chunks():
+        for i in range(0, len(egids), chunk_size):
+            chunk = egids[i:i + chunk_size]
+            where = f"EGID IN ({', '.join(str(int(e)) for e in chunk)})"  # EGID is numeric in this layer
+            params = {
+                "f": "geojson",
+                "where": where,
+                "returnGeometry": "true",
+                "outFields": "*",
+                "inSR": 4326,
+                "outSR": 4326,              # reproject to WGS84 for Leaflet
+                "geometryPrecision": 6,     # smaller payload; adjust if you need more detail
+            }
+            r = requests.get(SITG_BUILDINGS_QUERY, params=params, timeout=timeout)
+            r.raise_for_status()
+            yield r.json()
 
-    return {"type": "FeatureCollection", "features": features}
+    return assemble_feature_collection(_chunks())
 
 
 def add_highlight_layer(m: folium.Map, feature_collection: dict, name="Selected buildings (EGID)"):
@@ -73,28 +78,34 @@ def add_highlight_layer(m: folium.Map, feature_collection: dict, name="Selected
 def render_sitg_map(egids=None):
 
     CENTER = [46.2044, 6.1432]
+    # Display name -> tile_proxy layer (through the disk-cached proxy when PRISMAI_TILE_URL is set)
     WEBMERCATOR_BASEMAPS = {
-        "OSM": "OpenStreetMap",
-        "Esri Light Gray": "https://server.arcgisonline.com/ArcGIS/rest/services/Canvas/World_Light_Gray_Base/MapServer/tile/{z}/{y}/{x}",
-        "Esri Imagery": "https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
+        "OSM": "osm",
+        "Esri Light Gray": "esri-light-gray",
+        "Esri Imagery": "esri-imagery",
     }
     basemap_choice = "OSM"
 
     if egids:
         # Base map
         m = folium.Map(location=CENTER, zoom_start=15, control_scale=True, prefer_canvas=True, tiles=None)
-        bm = WEBMERCATOR_BASEMAPS[basemap_choice]
-        if bm == "OpenStreetMap":
-            folium.TileLayer(bm, name="OSM", overlay=False).add_to(m)
-        else:
-            folium.TileLayer(tiles=bm, attr="© Esri", name=basemap_choice, overlay=False).add_to(m)
+        layer = WEBMERCATOR_BASEMAPS[basemap_choice]
+        folium.TileLayer(tiles=tile_url(layer), attr=attribution(layer), name=basemap_choice,
+                         overlay=False, max_zoom=19).add_to(m)
 
         # If EGIDs provided, fetch and highlight (no popup)
         if egids:
-            with st.spinner("Fetching buildings by EGID…"):
-                fc = fetch_buildings_by_egid(egids)
+            with st.spinner("Fetching buildings by EGID…"), span("egid_fetch", n_egids=len(egids)) as sp:
+                try:
+                    fc = get_buildings_by_egid(egids)  # served from the prefetch cache when warm
+                except requests.RequestException as exc:
+                    fc = None
+                    st.warning(f"SITG building layer unreachable, showing the basemap only ({exc.__class__.__name__}).")
+                sp["n_features"] = len(fc["features"]) if fc else 0
 
-            if not fc["features"]:
+            if fc is None:
+                pass  # already warned above
+            elif not fc["features"]:
                 st.warning("No buildings found for the provided EGID(s).")
             else:
                 add_highlight_layer(m, fc, name="Selected buildings (EGID)")
@@ -0,0 +1,153 @@
+# startup_benchmark.py
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# ------------------------------------------------------------
+# Cold-start budget for app.py
+#
+#   python startup_benchmark.py                 # imports + first view through streamlit's AppTest
+#   python startup_benchmark.py --imports-only  # import budget only
+#
+# The first-view budget applies to the first paint: the first script run, which ends early with
+# st.rerun() when a page defers slow parts (the map page draws Folium + SITG on the rerun).
+# The complete first view, deferred parts included, is reported alongside.
+#
+# Exits with status 1 when a budget is exceeded, a heavy module is loaded by the imports or by
+# the first view of a route that does not need it, or the first view raises (smoke run of the
+# page, e.g. render_map_page).
+# ------------------------------------------------------------
+IMPORT_BUDGET_S = float(os.getenv("PRISMAI_IMPORT_BUDGET_S", "1.0"))
+FIRST_VIEW_BUDGET_S = float(os.getenv("PRISMAI_FIRST_VIEW_BUDGET_S", "1.0"))
+APP_FILE = Path(__file__).resolve().parent / "app.py"
+
+# Must only load on the route that needs them
+HEAVY_MODULES = ["matplotlib", "seaborn", "folium", "streamlit_folium", "chromadb",
+                 "sentence_transformers", "torch", "fitz", "openai"]
+
+# Heavy modules a route legitimately loads on its first view (deferred parts included)
+ROUTE_MODULES = {
+    "map": ["folium", "streamlit_folium"],
+    "report": [],
+}
+
+
+def startup_modules(app_file=APP_FILE) -> list:
+    """Modules app.py imports at module level, i.e. before the router renders anything."""
+    tree = ast.parse(Path(app_file).read_text(encoding="utf-8"))
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+    return list(dict.fromkeys(names))
+
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "heavy": sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+_FIRST_VIEW_PROBE = """
+import json, sys, time
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+# AppTest follows reruns within one run(): the first st.rerun() call marks the first paint
+reruns = []
+_rerun = st.rerun
+def _timed_rerun(*args, **kwargs):
+    reruns.append(time.perf_counter())
+    return _rerun(*args, **kwargs)
+st.rerun = _timed_rerun
+
+at = AppTest.from_file({app!r}, default_timeout=60)
+at.query_params["page"] = {route!r}
+t0 = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - t0
+prefetcher = sys.modules.get("prefetcher")
+if prefetcher is not None and prefetcher._executor is not None:
+    prefetcher._executor.shutdown(wait=True)  # background work started by the first view counts too
+print(json.dumps({{"seconds": elapsed, "first_paint": (reruns[0] - t0) if reruns else elapsed,
+                  "exceptions": [str(e.value) for e in at.exception],
+                  "heavy": sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+
+def _run_probe(code: str) -> dict:
+    env = {**os.environ, "PRISMAI_TRACE": "0"}
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=APP_FILE.parent, env=env)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure_imports(repeat: int = 3) -> dict:
+    """Import app.py's module-level imports in fresh interpreters; keep the best of `repeat` runs."""
+    code = _PROBE.format(modules=startup_modules(), heavy=HEAVY_MODULES)
+    runs = [_run_probe(code) for _ in range(repeat)]
+    best = min(runs, key=lambda r: r["seconds"])
+    best["heavy"] = sorted({m for r in runs for m in r["heavy"]})
+    return best
+
+
+def measure_first_view(route: str = "map") -> dict:
+    """
+    First view of `route` in a fresh interpreter (no browser; SITG queries still run):
+    {"first_paint": seconds until the first script run ends (budgeted), "seconds": complete first
+    view incl. deferred reruns, "exceptions": uncaught exception messages, "heavy": heavy modules loaded}.
+    """
+    return _run_probe(_FIRST_VIEW_PROBE.format(app=str(APP_FILE), route=route, heavy=HEAVY_MODULES))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Fail when app.py cold start exceeds its budget.")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_S, help="import budget in seconds")
+    parser.add_argument("--imports-only", action="store_true", help="skip the first script run")
+    parser.add_argument("--first-view-budget", type=float, default=FIRST_VIEW_BUDGET_S)
+    parser.add_argument("--route", default="map", choices=list(ROUTE_MODULES), help="route of the first view")
+    args = parser.parse_args(argv)
+
+    failed = False
+    res = measure_imports()
+    print(f"startup imports: {res['seconds']:.3f}s (budget {args.budget:.3f}s)")
+    if res["seconds"] > args.budget:
+        print("  ✗ over budget")
+        failed = True
+    if res["heavy"]:
+        print(f"  ✗ heavy modules loaded at startup: {', '.join(res['heavy'])}")
+        failed = True
+
+    if not args.imports_only:
+        # The Clean_Data CSV copy is written once per workbook change, not on every start
+        from energy_data import CACHE_DIR, read_sheet_cached
+        read_sheet_cached(APP_FILE.parent / "data" / "data_raw.xlsx", "Clean_Data", cache_dir=APP_FILE.parent / CACHE_DIR)
+        view = measure_first_view(args.route)
+        print(f"first paint ({args.route}): {view['first_paint']:.3f}s (budget {args.first_view_budget:.3f}s),"
+              f" complete first view {view['seconds']:.3f}s")
+        if view["first_paint"] > args.first_view_budget:
+            print("  ✗ over budget")
+            failed = True
+        leaked = sorted(set(view["heavy"]) - set(ROUTE_MODULES[args.route]))
+        if leaked:
+            print(f"  ✗ heavy modules loaded by the first view: {', '.join(leaked)}")
+            failed = True
+        for message in view["exceptions"]:
+            print(f"  ✗ page raised: {message}")
+            failed = True
+
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
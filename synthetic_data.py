@@ -0,0 +1,157 @@
+# synthetic_data.py
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------------
+# Synthetic canton-scale datasets (10k … 1M buildings)
+#
+# Mirrors the layout of the real inputs so app code paths can run unchanged:
+# - buildings   : buildings_cleaned.csv (category, id, nom, adresses, No EGID, SRE, % ENE RATIOS, …, EGIDs)
+# - general_data: data_raw.xlsx / Clean_Data (category, nom, annee, kwh_*, surfaces), incl. the
+#                 "2,023"-style strings the cleaning step has to handle
+# - fake SITG responses: GeoJSON FeatureCollections per IN-clause chunk, small polygons inside Geneva
+# ------------------------------------------------------------
+CATEGORIES = ["Health", "R&D", "Administration", "Education"]
+YEARS = (2020, 2021, 2022, 2023)
+GENEVA_BBOX = (5.956, 46.128, 6.310, 46.366)  # lon_min, lat_min, lon_max, lat_max
+
+# Typical kWh/m²·year per carrier and category (electricity, gas, district heating, heating oil)
+_INTENSITY = {
+    "Health": (190.0, 5.0, 125.0, 2.0),
+    "R&D": (185.0, 10.0, 90.0, 2.0),
+    "Administration": (45.0, 20.0, 35.0, 10.0),
+    "Education": (45.0, 30.0, 20.0, 5.0),
+}
+_CARRIERS = ["kwh_electrique", "kwh_gaz", "kwh_cad", "kwh_mazout"]
+
+
+def _org_sizes(rng, n_buildings: int, max_egids: int) -> np.ndarray:
+    """Split n_buildings into organisations of 1..max_egids EGIDs (sizes sum exactly to n_buildings)."""
+    sizes = rng.integers(1, max_egids + 1, size=n_buildings // max(1, (max_egids + 1) // 2) + 1)
+    cum = np.cumsum(sizes)
+    n_orgs = int(np.searchsorted(cum, n_buildings)) + 1
+    sizes = sizes[:n_orgs]
+    sizes[-1] -= int(sizes.sum() - n_buildings)
+    return sizes[sizes > 0]
+
+
+def generate_dataset(n_buildings: int, years=YEARS, max_egids: int = 10, seed: int = 0,
+                     messy: bool = True) -> dict:
+    """
+    Returns {"buildings", "general_data", "egids"}; `egids` is the flat array of all generated EGIDs.
+    With `messy`, ~5 % of years / energy values are stored as comma-formatted strings.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = _org_sizes(rng, n_buildings, max_egids)
+    n_orgs = len(sizes)
+
+    egids = 1_000_000 + rng.choice(50 * n_buildings, size=n_buildings, replace=False)
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+    egid_lists = ["[" + ", ".join(map(str, egids[a:b])) + "]" for a, b in zip(bounds[:-1], bounds[1:])]
+
+    cat_idx = rng.integers(0, len(CATEGORIES), size=n_orgs)
+    categories = np.asarray(CATEGORIES, dtype=object)[cat_idx]
+    names = np.char.add("ORG-", np.arange(1, n_orgs + 1).astype(str)).astype(object)
+    sre = np.round(rng.lognormal(mean=8.5, sigma=1.0, size=n_orgs) * sizes, 2)
+
+    buildings = pd.DataFrame({
+        "category": categories,
+        "id": np.arange(1, n_orgs + 1),
+        "nom": names,
+        "adresses": np.char.add("Rue Synthétique ", rng.integers(1, 200, n_orgs).astype(str)).astype(object),
+        "No EGID": egids[bounds[:-1]],
+        "SRE": sre,
+        "% ENE RATIOS": rng.random(n_orgs),
+        "NB FICHES\n(SITG / ST)": rng.integers(0, 12, n_orgs),
+        "EGIDs": egid_lists,
+    })
+
+    # One energy row per organisation and year: intensity × SRE × yearly drift
+    years = np.asarray(list(years))
+    n_rows = n_orgs * len(years)
+    org_rep = np.repeat(np.arange(n_orgs), len(years))
+    intensity = np.asarray([_INTENSITY[c] for c in CATEGORIES])[cat_idx[org_rep]]       # (R, 4)
+    drift = rng.normal(1.0, 0.08, size=(n_rows, len(_CARRIERS))).clip(0.5, 1.5)
+    kwh = np.round(intensity * sre[org_rep, None] * drift, 1)
+
+    general_data = pd.DataFrame(kwh, columns=_CARRIERS)
+    general_data.insert(0, "annee", np.tile(years, n_orgs))
+    general_data.insert(0, "nom", names[org_rep])
+    general_data.insert(0, "category", categories[org_rep])
+    general_data["surface_nette"] = np.round(sre[org_rep] * 1.15, 2)
+    general_data["surface_ref_energetique"] = sre[org_rep]
+
+    if messy:
+        general_data["annee"] = general_data["annee"].astype(object)
+        dirty = rng.random(n_rows) < 0.05
+        general_data.loc[dirty, "annee"] = [f"{y:,}" for y in general_data.loc[dirty, "annee"]]
+        for col in _CARRIERS:
+            general_data[col] = general_data[col].astype(object)
+            dirty = rng.random(n_rows) < 0.05
+            general_data.loc[dirty, col] = [f"{v:,.1f}" for v in general_data.loc[dirty, col]]
+
+    return {"buildings": buildings, "general_data": general_data, "egids": egids}
+
+
+def fake_sitg_chunks(egids, chunk_size: int = 900, seed: int = 0, size_deg: float = 0.0002) -> list:
+    """
+    GeoJSON FeatureCollections shaped like the SITG layer-47 responses, one per IN-clause chunk:
+    a small square polygon per EGID at a random position inside the Geneva bounding box.
+    """
+    rng = np.random.default_rng(seed)
+    egids = np.asarray(egids)
+    lon0, lat0, lon1, lat1 = GENEVA_BBOX
+    lon = np.round(rng.uniform(lon0, lon1, len(egids)), 6)
+    lat = np.round(rng.uniform(lat0, lat1, len(egids)), 6)
+    d = size_deg
+    # (N, 5, 2) closed rings
+    rings = np.stack([
+        np.stack([lon, lat], axis=1),
+        np.stack([lon + d, lat], axis=1),
+        np.stack([lon + d, lat + d], axis=1),
+        np.stack([lon, lat + d], axis=1),
+        np.stack([lon, lat], axis=1),
+    ], axis=1).round(6).tolist()
+
+    chunks = []
+    for i in range(0, len(egids), chunk_size):
+        chunks.append({
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "geometry": {"type": "Polygon", "coordinates": [rings[j]]},
+                    "properties": {"EGID": int(egids[j])},
+                }
+                for j in range(i, min(i + chunk_size, len(egids)))
+            ],
+        })
+    return chunks
+
+
+def write_dataset(ds: dict, out_dir, excel: bool = False) -> Path:
+    """Write buildings_cleaned.csv + data_raw.csv (and data_raw.xlsx / Clean_Data if `excel`)."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ds["buildings"].to_csv(out_dir / "buildings_cleaned.csv", index=False)
+    ds["general_data"].to_csv(out_dir / "data_raw.csv", index=False)
+    if excel:
+        ds["general_data"].to_excel(out_dir / "data_raw.xlsx", sheet_name="Clean_Data", index=False)
+    return out_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic canton-scale dataset.")
+    parser.add_argument("--buildings", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="default: data/synthetic/<buildings>")
+    parser.add_argument("--excel", action="store_true", help="also write data_raw.xlsx (slow above ~100k)")
+    args = parser.parse_args()
+
+    ds = generate_dataset(args.buildings, seed=args.seed)
+    out = write_dataset(ds, args.out or Path("data") / "synthetic" / str(args.buildings), excel=args.excel)
+    print(f"✅ {len(ds['buildings'])} organisations / {args.buildings} buildings / "
+          f"{len(ds['general_data'])} energy rows → {out}")
@@ -0,0 +1,394 @@
+# telemetry.py
+import atexit
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# ------------------------------------------------------------
+# Lightweight tracing: spans -> JSON log lines + per-process histograms (shared through SQLite)
+#
+# Environment switches (all optional):
+# - PRISMAI_TRACE_LOG      : file to append JSON span lines to (default: stdout)
+# - PRISMAI_TRACE=0        : disable span logging (histograms are still recorded)
+# - PRISMAI_METRICS_PORT   : start a local /metrics endpoint on this port
+# - PRISMAI_METRICS_DB     : SQLite file where processes without the endpoint (job workers, report
+#                            script) publish their histograms for it (default: data/metrics/metrics.sqlite3)
+# - PRISMAI_PROFILE        : "cprofile" or "pyinstrument" to profile `profiled(...)` blocks
+# - PRISMAI_PROFILE_DIR    : where profiles are written (default: data/profiles)
+# ------------------------------------------------------------
+_correlation_id = contextvars.ContextVar("correlation_id", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# Histogram bucket upper bounds, in milliseconds
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+METRICS_DB = Path(os.getenv("PRISMAI_METRICS_DB", "data/metrics/metrics.sqlite3"))
+SHARE_INTERVAL = 5.0  # seconds between two publications of a process's histograms
+
+_logger = logging.getLogger("prismai.trace")
+if not _logger.handlers:
+    _trace_log = os.getenv("PRISMAI_TRACE_LOG")
+    _handler = logging.FileHandler(_trace_log, encoding="utf-8") if _trace_log else logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(_handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+_LOG_ENABLED = os.getenv("PRISMAI_TRACE", "1") != "0"
+
+
+# ------------------------------------------------------------
+# Correlation ID (one per Streamlit session / report request)
+# ------------------------------------------------------------
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def set_correlation_id(cid: str):
+    """Bind `cid` to the current context (Streamlit script thread, worker, …)."""
+    return _correlation_id.set(cid)
+
+
+def get_correlation_id() -> str:
+    return _correlation_id.get()
+
+
+# ------------------------------------------------------------
+# Histograms
+# ------------------------------------------------------------
+class _Histogram:
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)  # last slot = +Inf
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += ms
+        self.count += 1
+        self.max = max(self.max, ms)
+
+    def merge(self, counts, total: float, count: int, max_ms: float):
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.total += total
+        self.count += count
+        self.max = max(self.max, max_ms)
+
+    def quantile(self, q: float) -> float:
+        """Bucket-resolution quantile (upper bound of the bucket holding the q-th sample)."""
+        if not self.count:
+            return 0.0
+        target, acc = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+
+_hist_lock = threading.Lock()
+_histograms = {}
+_n_observed = 0
+
+
+def observe(name: str, ms: float):
+    global _n_observed
+    with _hist_lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = _Histogram()
+        h.observe(ms)
+        _n_observed += 1
+
+
+# ------------------------------------------------------------
+# Cross-process sharing: each process upserts its cumulative histograms (one row per span),
+# the process serving /metrics adds up the rows of all the others.
+# ------------------------------------------------------------
+_SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS span_histograms (
+    process    TEXT NOT NULL,
+    span       TEXT NOT NULL,
+    counts     TEXT NOT NULL,
+    total      REAL NOT NULL,
+    count      INTEGER NOT NULL,
+    max        REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (process, span)
+);
+"""
+_process_key = None
+_shared_pid = None
+_share_lock = threading.Lock()
+_n_shared = 0
+
+
+def _connect_shared(db_path=None) -> sqlite3.Connection:
+    path = Path(db_path or METRICS_DB)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SHARED_SCHEMA)
+    return conn
+
+
+def _publish(db_path=None):
+    """Write this process's histograms to the shared database if anything was observed since."""
+    global _n_shared
+    with _hist_lock:
+        if _n_observed == _n_shared:
+            return
+        seen = _n_observed
+        rows = [(_process_key, name, json.dumps(h.counts), h.total, h.count, h.max, time.time())
+                for name, h in _histograms.items()]
+    try:
+        conn = _connect_shared(db_path)
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO span_histograms VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        finally:
+            conn.close()
+        _n_shared = seen
+    except sqlite3.Error as exc:
+        _logger.warning("Could not publish span histograms to %s: %s", db_path or METRICS_DB, exc)
+
+
+def share_metrics(db_path=None):
+    """
+    Publish this process's histograms every SHARE_INTERVAL seconds (and at exit), so the process
+    serving /metrics includes them. For job workers, the report script and app processes that
+    could not bind the metrics port. Idempotent.
+    """
+    global _process_key, _shared_pid
+    with _share_lock:
+        if _shared_pid == os.getpid():
+            return
+        _shared_pid = os.getpid()  # a forked child publishes under its own key
+        _process_key = f"{socket.gethostname()}:{_shared_pid}:{int(time.time())}"
+
+    def loop():
+        while True:
+            time.sleep(SHARE_INTERVAL)
+            _publish(db_path)
+
+    threading.Thread(target=loop, name="prismai-metrics-share", daemon=True).start()
+    atexit.register(_publish, db_path)
+
+
+def _all_histograms(db_path=None) -> dict:
+    """This process's histograms plus those published by the other processes."""
+    with _hist_lock:
+        merged = {}
+        for name, h in _histograms.items():
+            merged[name] = m = _Histogram()
+            m.merge(h.counts, h.total, h.count, h.max)
+    path = Path(db_path or METRICS_DB)
+    if not path.exists():
+        return merged
+    try:
+        conn = _connect_shared(path)
+        try:
+            rows = conn.execute(
+                "SELECT span, counts, total, count, max FROM span_histograms WHERE process IS NOT ?",
+                (_process_key,),
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as exc:
+        _logger.warning("Could not read shared span histograms from %s: %s", path, exc)
+        return merged
+    for name, counts, total, count, max_ms in rows:
+        merged.setdefault(name, _Histogram()).merge(json.loads(counts), total, count, max_ms)
+    return merged
+
+
+def metrics_snapshot() -> dict:
+    """{span name: {count, sum_ms, max_ms, p50_ms, p95_ms, buckets}} for every span seen by any process."""
+    return {
+        name: {
+            "count": h.count,
+            "sum_ms": round(h.total, 3),
+            "max_ms": round(h.max, 3),
+            "p50_ms": h.quantile(0.50),
+            "p95_ms": h.quantile(0.95),
+            "buckets": dict(zip([str(b) for b in BUCKETS_MS] + ["+Inf"], h.counts)),
+        }
+        for name, h in _all_histograms().items()
+    }
+
+
+def render_prometheus() -> str:
+    """Prometheus text exposition of all span histograms (this process + shared ones)."""
+    lines = [
+        "# HELP prismai_span_duration_ms Span duration in milliseconds.",
+        "# TYPE prismai_span_duration_ms histogram",
+    ]
+    for name, h in sorted(_all_histograms().items()):
+        acc = 0
+        for bound, c in zip([str(b) for b in BUCKETS_MS] + ["+Inf"], h.counts):
+            acc += c
+            lines.append(f'prismai_span_duration_ms_bucket{{span="{name}",le="{bound}"}} {acc}')
+        lines.append(f'prismai_span_duration_ms_sum{{span="{name}"}} {h.total:.3f}')
+        lines.append(f'prismai_span_duration_ms_count{{span="{name}"}} {h.count}')
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------------
+# Spans
+# ------------------------------------------------------------
+def _emit(record: dict):
+    if _LOG_ENABLED:
+        _logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def event(name: str, **attrs):
+    """Point-in-time structured log line (e.g. first token received)."""
+    _emit({"ts": time.time(), "event": name, "cid": get_correlation_id(),
+           "parent": _current_span.get(), **attrs})
+
+
+# Streamlit's st.rerun() / st.stop() unwind through spans without being failures
+_CONTROL_FLOW = ("RerunException", "StopException")
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """
+    Time a block:
+        with span("excel_load", sheet="Clean_Data"):
+            ...
+    Emits one JSON line on exit (duration, correlation id, parent span, status) and feeds
+    the `name` histogram. Extra attributes can be attached while running via the yielded dict.
+    """
+    parent = _current_span.get()
+    token = _current_span.set(name)
+    extra = {}
+    status = "ok"
+    t0 = time.perf_counter()
+    try:
+        yield extra
+    except BaseException as exc:
+        if type(exc).__name__ not in _CONTROL_FLOW:
+            status = type(exc).__name__
+        raise
+    finally:
+        ms = (time.perf_counter() - t0) * 1000.0
+        _current_span.reset(token)
+        observe(name, ms)
+        _emit({"ts": time.time(), "span": name, "duration_ms": round(ms, 3), "status": status,
+               "cid": get_correlation_id(), "parent": parent, **attrs, **extra})
+
+
+def timed(name: str = None):
+    """Decorator form of `span` (defaults to the function's qualified name)."""
+    def deco(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ------------------------------------------------------------
+# Opt-in profiling (PRISMAI_PROFILE=cprofile|pyinstrument)
+# ------------------------------------------------------------
+@contextlib.contextmanager
+def profiled(name: str):
+    """Profile the block when PRISMAI_PROFILE is set; no-op otherwise."""
+    mode = (os.getenv("PRISMAI_PROFILE") or "").lower()
+    if mode not in ("cprofile", "pyinstrument"):
+        yield
+        return
+
+    out_dir = Path(os.getenv("PRISMAI_PROFILE_DIR", "data/profiles"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = out_dir / f"{time.strftime('%Y%m%d_%H%M%S')}__{name}__{get_correlation_id() or 'nocid'}"
+
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            _logger.warning("PRISMAI_PROFILE=pyinstrument but pyinstrument is not installed; falling back to cProfile")
+        else:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                Path(f"{stem}.html").write_text(profiler.output_html(), encoding="utf-8")
+            return
+
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(f"{stem}.prof")
+
+
+# ------------------------------------------------------------
+# Local metrics endpoint (GET /metrics -> Prometheus text, GET /metrics.json -> JSON)
+# ------------------------------------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, ctype = json.dumps(metrics_snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, ctype = render_prometheus().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # keep stdout for span lines
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = None, host: str = "127.0.0.1"):
+    """
+    Start the metrics endpoint once per process (daemon thread); it also serves the histograms
+    other processes publish with `share_metrics`.
+    Without `port`, PRISMAI_METRICS_PORT is used; nothing is started if neither is set.
+    """
+    global _server
+    port = port or int(os.getenv("PRISMAI_METRICS_PORT") or 0)
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                # Another process (e.g. a second Streamlit worker) already serves this port
+                share_metrics()
+                return None
+            threading.Thread(target=_server.serve_forever, name="prismai-metrics", daemon=True).start()
+        return _server
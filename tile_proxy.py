@@ -0,0 +1,283 @@
+# tile_proxy.py
+import argparse
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+# ------------------------------------------------------------
+# Local basemap tile proxy with a disk cache (z/x/y layout, LRU-evicted)
+#
+#   data/tile_cache/<layer>/<z>/<x>/<y>.<ext>
+#
+# The map only uses the proxy when PRISMAI_TILE_URL is set: the browser fetches the tiles, so the
+# URL must be reachable by every client (e.g. /tiles on the app's own origin through the reverse
+# proxy, which avoids mixed content on HTTPS). Unset, tiles load straight from upstream.
+#
+# - PRISMAI_TILE_URL         : base URL the *browser* uses for the proxy, e.g. https://prismai.example.ch
+# - PRISMAI_TILE_PORT        : port of the proxy started in the app process (default 8765)
+# - PRISMAI_TILE_CACHE_MB    : cache size before least-recently-used tiles are evicted (default 1024)
+#
+# Pre-seed the Geneva area once, with at most SEED_WORKERS connections, from a provider whose terms
+# allow it (check them first). tile.openstreetmap.org forbids bulk downloads and is refused unless
+# --allow-osm is given (e.g. for a few low zoom levels):
+#   python tile_proxy.py seed --layer <layer> --zooms 10 16
+# ------------------------------------------------------------
+CACHE_ROOT = Path(os.getenv("PRISMAI_TILE_CACHE", "data/tile_cache"))
+TILE_PORT = int(os.getenv("PRISMAI_TILE_PORT", "8765"))
+CACHE_MAX_BYTES = int(float(os.getenv("PRISMAI_TILE_CACHE_MB", "1024")) * 1024 * 1024)
+MAX_UPSTREAM = 8           # concurrent upstream fetches of the serving proxy
+SEED_WORKERS = 2           # hard cap on concurrent fetches while seeding
+UPSTREAM_TIMEOUT = 10
+USER_AGENT = "PrismAI-Geneva-tile-proxy/1.0"
+
+GENEVA_BBOX = (5.956, 46.128, 6.310, 46.366)  # lon_min, lat_min, lon_max, lat_max
+SEED_ZOOMS = (10, 16)
+
+# layer -> (upstream URL template, file extension, attribution)
+UPSTREAMS = {
+    "osm": ("https://tile.openstreetmap.org/{z}/{x}/{y}.png", "png",
+            "© OpenStreetMap contributors"),
+    "esri-light-gray": ("https://server.arcgisonline.com/ArcGIS/rest/services/Canvas/World_Light_Gray_Base/MapServer/tile/{z}/{y}/{x}",
+                        "jpg", "© Esri"),
+    "esri-imagery": ("https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
+                     "jpg", "© Esri"),
+}
+
+# Layers whose tile usage policy forbids bulk downloading / pre-seeding
+NO_BULK_LAYERS = {"osm"}
+
+_CONTENT_TYPES = {"png": "image/png", "jpg": "image/jpeg"}
+_PATH_RE = re.compile(r"^/tiles/(?P<layer>[\w-]+)/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.(?:png|jpg)$")
+
+
+class TileCache:
+    """Disk-backed tile cache with size-bounded LRU eviction and single-flight upstream fetches."""
+
+    def __init__(self, root=CACHE_ROOT, max_bytes: int = CACHE_MAX_BYTES, max_upstream: int = MAX_UPSTREAM):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._upstream = threading.BoundedSemaphore(max_upstream)
+        self._session = requests.Session()
+        self._session.headers["User-Agent"] = USER_AGENT
+        # LRU order = least recently used first; rebuilt from file mtimes at startup
+        files = sorted(self.root.glob("*/*/*/*.*"), key=lambda p: p.stat().st_mtime) if self.root.exists() else []
+        self._lru = OrderedDict((p, p.stat().st_size) for p in files)
+        self.total_bytes = sum(self._lru.values())
+
+    def path(self, layer: str, z: int, x: int, y: int) -> Path:
+        return self.root / layer / str(z) / str(x) / f"{y}.{UPSTREAMS[layer][1]}"
+
+    def _touch(self, p: Path):
+        with self._lock:
+            if p in self._lru:
+                self._lru.move_to_end(p)
+        try:
+            os.utime(p)  # persist recency across restarts
+        except OSError:
+            pass
+
+    def _store(self, p: Path, data: bytes):
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(p.suffix + f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, p)
+        with self._lock:
+            self.total_bytes += len(data) - self._lru.pop(p, 0)
+            self._lru[p] = len(data)
+            while self.total_bytes > self.max_bytes and len(self._lru) > 1:
+                old, size = self._lru.popitem(last=False)
+                self.total_bytes -= size
+                try:
+                    old.unlink()
+                except OSError:
+                    pass
+
+    def _fetch(self, layer: str, z: int, x: int, y: int) -> bytes:
+        url = UPSTREAMS[layer][0].format(z=z, x=x, y=y)
+        with self._upstream:
+            r = self._session.get(url, timeout=UPSTREAM_TIMEOUT)
+        r.raise_for_status()
+        return r.content
+
+    def get(self, layer: str, z: int, x: int, y: int):
+        """Tile bytes from disk, else from upstream (stored); None if unavailable (e.g. offline)."""
+        p = self.path(layer, z, x, y)
+        try:
+            data = p.read_bytes()
+        except OSError:
+            data = None
+        if data is not None:
+            self._touch(p)
+            return data
+
+        # Single flight: concurrent misses for the same tile share one upstream request
+        with self._lock:
+            event = self._inflight.get(p)
+            leader = event is None
+            if leader:
+                event = self._inflight[p] = threading.Event()
+        if not leader:
+            event.wait(UPSTREAM_TIMEOUT + 1)
+            return p.read_bytes() if p.exists() else None
+
+        try:
+            data = self._fetch(layer, z, x, y)
+            self._store(p, data)
+            return data
+        except Exception:
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(p, None)
+            event.set()
+
+    def has(self, layer: str, z: int, x: int, y: int) -> bool:
+        return self.path(layer, z, x, y).exists()
+
+
+# ------------------------------------------------------------
+# Pre-seeding
+# ------------------------------------------------------------
+def _lonlat_to_tile(lon: float, lat: float, z: int):
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_r = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_r)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bbox(bbox=GENEVA_BBOX, zooms=SEED_ZOOMS):
+    """All (z, x, y) covering `bbox` for zoom levels zooms[0]..zooms[1] (inclusive)."""
+    lon0, lat0, lon1, lat1 = bbox
+    for z in range(zooms[0], zooms[1] + 1):
+        x0, y0 = _lonlat_to_tile(lon0, lat1, z)  # north-west corner
+        x1, y1 = _lonlat_to_tile(lon1, lat0, z)  # south-east corner
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+
+def seed(layer: str, bbox=GENEVA_BBOX, zooms=SEED_ZOOMS, workers: int = SEED_WORKERS, cache: TileCache = None,
+         allow_osm: bool = False):
+    """
+    Fetch every missing tile of `bbox` with at most SEED_WORKERS connections.
+    Returns (already cached, fetched, failed).
+    """
+    if layer in NO_BULK_LAYERS and not allow_osm:
+        raise ValueError(f"Bulk downloading '{layer}' is forbidden by its tile usage policy; "
+                         "seed another layer or pass allow_osm=True for a small area/zoom range.")
+    cache = cache or get_cache()
+    missing = [t for t in tiles_in_bbox(bbox, zooms) if not cache.has(layer, *t)]
+    cached = sum(1 for _ in tiles_in_bbox(bbox, zooms)) - len(missing)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, SEED_WORKERS))) as pool:
+        results = list(pool.map(lambda t: cache.get(layer, *t) is not None, missing))
+    fetched = sum(results)
+    return cached, fetched, len(missing) - fetched
+
+
+# ------------------------------------------------------------
+# HTTP server (GET /tiles/<layer>/<z>/<x>/<y>.<ext>)
+# ------------------------------------------------------------
+_cache = None
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_cache() -> TileCache:
+    global _cache
+    with _server_lock:
+        if _cache is None:
+            _cache = TileCache()
+        return _cache
+
+
+class _TileHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        m = _PATH_RE.match(self.path.split("?", 1)[0])
+        if not m or m["layer"] not in UPSTREAMS:
+            self.send_error(404)
+            return
+        data = get_cache().get(m["layer"], int(m["z"]), int(m["x"]), int(m["y"]))
+        if data is None:
+            self.send_error(503, "Tile unavailable (upstream unreachable and not cached)")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", _CONTENT_TYPES[UPSTREAMS[m["layer"]][1]])
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "public, max-age=604800")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def enabled() -> bool:
+    """The map uses the proxy only once a browser-reachable PRISMAI_TILE_URL is configured."""
+    return bool(os.getenv("PRISMAI_TILE_URL"))
+
+
+def start_tile_server(port: int = TILE_PORT, host: str = "127.0.0.1"):
+    """Start the proxy once per process (daemon thread). A busy port means another worker serves it."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _TileHandler)
+            except OSError:
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="prismai-tiles", daemon=True).start()
+        return _server
+
+
+def tile_url(layer: str) -> str:
+    """Leaflet URL template for `layer`: the proxy behind PRISMAI_TILE_URL if set, upstream otherwise."""
+    if not enabled():
+        return UPSTREAMS[layer][0]
+    start_tile_server()
+    base = os.environ["PRISMAI_TILE_URL"].rstrip("/")
+    return f"{base}/tiles/{layer}/{{z}}/{{x}}/{{y}}.{UPSTREAMS[layer][1]}"
+
+
+def attribution(layer: str) -> str:
+    return UPSTREAMS[layer][2]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local basemap tile proxy.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve", help="run the proxy in the foreground")
+    p_serve.add_argument("--port", type=int, default=TILE_PORT)
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_seed = sub.add_parser("seed", help="pre-fetch the Geneva bounding box")
+    p_seed.add_argument("--layer", choices=list(UPSTREAMS), required=True)
+    p_seed.add_argument("--zooms", type=int, nargs=2, default=list(SEED_ZOOMS))
+    p_seed.add_argument("--workers", type=int, default=SEED_WORKERS, help=f"capped at {SEED_WORKERS}")
+    p_seed.add_argument("--allow-osm", action="store_true",
+                        help="seed tile.openstreetmap.org anyway (its policy forbids bulk downloads)")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        server = ThreadingHTTPServer((args.host, args.port), _TileHandler)
+        print(f"Serving tiles on http://{args.host}:{args.port}/tiles/<layer>/<z>/<x>/<y>")
+        server.serve_forever()
+    else:
+        if args.layer in NO_BULK_LAYERS and not args.allow_osm:
+            parser.error(f"'{args.layer}' forbids bulk downloads (tile usage policy); pick another --layer "
+                         "or pass --allow-osm for a small zoom range")
+        n = sum(1 for _ in tiles_in_bbox(GENEVA_BBOX, tuple(args.zooms)))
+        print(f"Seeding {n} tiles of '{args.layer}' for zooms {args.zooms[0]}-{args.zooms[1]}…")
+        cached, fetched, failed = seed(args.layer, zooms=tuple(args.zooms), workers=args.workers,
+                                       allow_osm=args.allow_osm)
+        print(f"✅ {cached} already cached, {fetched} fetched, {failed} failed")
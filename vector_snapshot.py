@@ -0,0 +1,454 @@
+# vector_snapshot.py
+import argparse
+import datetime
+import heapq
+import json
+import logging
+import mmap
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+# ------------------------------------------------------------
+# Read-only, memory-mapped snapshot of a Chroma collection
+#
+# data/vector_snapshots/<slug>/
+#   manifest.json   dim, count, dtype, metric, graph degree, source collection (+ chroma.sqlite3 mtime/size)
+#   vectors.npy     (n, dim) embeddings (float16 or float32, L2-normalised for "cosine"), mmap'ed
+#   sq_norms.npy    (n,) float32 squared norms of the stored vectors ("l2" only)
+#   graph.npy       (n, M) int32 k-NN graph used for approximate search, mmap'ed
+#   records.jsonl   one {"id", "document", "metadata"} per line
+#   offsets.npy     (n + 1,) int64 byte offsets into records.jsonl
+#
+# Opening a snapshot only maps files: every app worker shares the same page cache,
+# and no Chroma client / HNSW load happens on the query path. A snapshot whose source
+# chroma.sqlite3 changed since the export (re-ingested knowledge base) is not opened.
+#
+# Distances follow the source collection's `hnsw:space` exactly like Chroma returns them
+# (Chroma's default "l2" = squared euclidean, "ip" = 1 - dot, "cosine" = 1 - cos), so the
+# `d=` values in prompts do not change scale whether or not a snapshot exists.
+# ------------------------------------------------------------
+SNAPSHOT_ROOT = Path("data") / "vector_snapshots"
+CHROMA_ROOT = Path("data") / "chroma_dbs"
+
+GRAPH_DEGREE = 24          # diversified neighbours kept per node
+GRAPH_CANDIDATES = 64      # exact nearest neighbours considered when pruning
+LONG_LINKS = 4             # extra random edges per node (jumps between clusters)
+PRUNE_ALPHA = 1.2          # > 1 keeps some longer edges (Vamana)
+BRUTE_FORCE_MAX = 20000    # below this size an exact scan beats the graph walk
+EF_SEARCH = 96             # beam width of the graph search
+MIN_GRAPH_RECALL = 0.95    # graph search is only used when its recall@10 vs. exact reaches this
+RECALL_QUERIES = 200       # probe queries for the export-time recall check
+_BLOCK = 4096              # rows per block for exact scans / graph building
+METRICS = ("l2", "ip", "cosine")
+DEFAULT_METRIC = "l2"      # Chroma's default hnsw:space
+
+logger = logging.getLogger(__name__)
+
+
+def _normalise(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.where(norms == 0, 1.0, norms)
+
+
+def _distances(metric: str, rows: np.ndarray, q: np.ndarray, rows_sq=None, q_sq=None) -> np.ndarray:
+    """
+    Distances between `rows` (n, d) and `q` (d,) or (d, m) in Chroma's convention.
+    For "l2", `rows_sq` / `q_sq` are the precomputed squared norms.
+    """
+    dots = rows.astype(np.float32) @ q
+    if metric == "l2":
+        if rows_sq.ndim == 1 and dots.ndim == 2:
+            rows_sq = rows_sq[:, None]
+        dots *= -2.0  # in place: blocks of the graph build are large
+        dots += rows_sq
+        dots += q_sq
+        return np.maximum(dots, 0.0, out=dots)
+    np.subtract(1.0, dots, out=dots)
+    return dots
+
+
+def _knn(vectors: np.ndarray, k: int, metric: str, sq_norms=None):
+    """Exact (n, k) neighbour ids and distances by blocked distance computations (no self-loops)."""
+    n = len(vectors)
+    full_t = np.ascontiguousarray(vectors.astype(np.float32).T)
+    idx = np.empty((n, k), dtype=np.int64)
+    dist = np.empty((n, k), dtype=np.float32)
+    for start in range(0, n, _BLOCK):
+        block = full_t[:, start:start + _BLOCK].T
+        block_sq = sq_norms[start:start + _BLOCK] if sq_norms is not None else None
+        dists = _distances(metric, block, full_t, block_sq, sq_norms)
+        rows = np.arange(len(block))
+        dists[rows, start + rows] = np.inf
+        nn = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        nd = np.take_along_axis(dists, nn, axis=1)
+        order = np.argsort(nd, axis=1)
+        idx[start:start + len(block)] = np.take_along_axis(nn, order, axis=1)
+        dist[start:start + len(block)] = np.take_along_axis(nd, order, axis=1)
+    return idx, dist
+
+
+def _prune(cand: np.ndarray, cand_dist: np.ndarray, vectors, sq_norms, metric: str, degree: int,
+           alpha: float) -> np.ndarray:
+    """
+    Diversified neighbour selection (NSG / Vamana rule): walking candidates from nearest to
+    farthest, keep c unless an already kept neighbour k is much closer to c than the node is
+    (alpha · d(k, c) <= d(node, c)). Keeps edges pointing into different directions/clusters.
+    """
+    order = np.argsort(cand_dist, kind="stable")
+    cand, cand_dist = cand[order], cand_dist[order]
+    rows_sq = sq_norms[cand] if sq_norms is not None else None
+    pair = _distances(metric, vectors[cand], vectors[cand].astype(np.float32).T, rows_sq, rows_sq)
+    alive = np.ones(len(cand), dtype=bool)
+    kept = []
+    for i in range(len(cand)):
+        if not alive[i]:
+            continue
+        kept.append(i)
+        if len(kept) == degree:
+            break
+        alive &= alpha * pair[i] > cand_dist
+    return cand[kept]
+
+
+def _build_graph(vectors: np.ndarray, degree: int, metric: str, sq_norms=None, seed: int = 0):
+    """
+    Navigable graph for the beam search: exact k-NN candidates, diversified with `_prune`,
+    made (mostly) bidirectional, plus LONG_LINKS random edges per node so the walk can jump
+    between clusters. Returns ((n, degree + LONG_LINKS) int32 graph padded with -1, entry node).
+    """
+    n = len(vectors)
+    width = degree + LONG_LINKS
+    graph = np.full((n, width), -1, dtype=np.int32)
+    if n <= 1:
+        return graph, 0
+    vecs = np.asarray(vectors, dtype=np.float32)
+    alpha = PRUNE_ALPHA if metric != "ip" else 1.0
+    cand_idx, cand_dist = _knn(vecs, min(GRAPH_CANDIDATES, n - 1), metric, sq_norms)
+
+    out = [_prune(cand_idx[p], cand_dist[p], vecs, sq_norms, metric, degree, alpha) for p in range(n)]
+
+    # Reverse edges; nodes that overflow are re-pruned over the union
+    incoming = [[] for _ in range(n)]
+    for p, nbrs in enumerate(out):
+        for c in nbrs.tolist():
+            incoming[c].append(p)
+    for c in range(n):
+        if not incoming[c]:
+            continue
+        merged = np.unique(np.concatenate([out[c], np.asarray(incoming[c], dtype=np.int64)]))
+        if len(merged) <= degree:
+            out[c] = merged
+            continue
+        rows_sq = sq_norms[merged] if sq_norms is not None else None
+        q_sq = sq_norms[c] if sq_norms is not None else None
+        d = _distances(metric, vecs[merged], vecs[c], rows_sq, q_sq)
+        out[c] = _prune(merged, d, vecs, sq_norms, metric, degree, alpha)
+
+    for p, nbrs in enumerate(out):
+        graph[p, :len(nbrs)] = nbrs
+    rng = np.random.default_rng(seed)
+    graph[:, degree:] = rng.integers(0, n, size=(n, LONG_LINKS))
+
+    # Entry = medoid (node nearest to the centroid)
+    centroid = vecs.mean(axis=0)
+    entry = int(np.argmin(_distances(metric, vecs, centroid, sq_norms, float(centroid @ centroid))))
+    return graph, entry
+
+
+def write_snapshot(out_dir, ids, embeddings, documents=None, metadatas=None, *,
+                   dtype: str = "float16", degree: int = GRAPH_DEGREE, metric: str = DEFAULT_METRIC,
+                   source: dict = None) -> Path:
+    """
+    Write a snapshot from raw arrays; `metric` is the source collection's hnsw:space.
+    The directory is replaced atomically, so readers never see a half-written snapshot.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}'. Choose among {list(METRICS)}.")
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    if len(ids) == 0:
+        embeddings = np.zeros((0, 0), dtype=np.float32)  # empty collection: nothing to reshape or link
+    else:
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+    vectors = (_normalise(embeddings) if metric == "cosine" else embeddings).astype(dtype)
+    sq_norms = None
+    if metric == "l2":
+        sq_norms = np.einsum("ij,ij->i", vectors.astype(np.float32), vectors.astype(np.float32))
+        np.save(tmp_dir / "sq_norms.npy", sq_norms)
+    np.save(tmp_dir / "vectors.npy", vectors)
+    if len(ids):
+        graph, entry = _build_graph(vectors, degree, metric, sq_norms)
+    else:
+        graph, entry = np.zeros((0, degree + LONG_LINKS), dtype=np.int32), 0
+    np.save(tmp_dir / "graph.npy", graph)
+
+    documents = documents if documents is not None else [None] * len(ids)
+    metadatas = metadatas if metadatas is not None else [None] * len(ids)
+    offsets = [0]
+    with open(tmp_dir / "records.jsonl", "wb") as f:
+        for rid, doc, meta in zip(ids, documents, metadatas):
+            line = json.dumps({"id": rid, "document": doc, "metadata": meta}, ensure_ascii=False).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(tmp_dir / "offsets.npy", np.asarray(offsets, dtype=np.int64))
+
+    manifest = {
+        "count": int(len(ids)),
+        "dim": int(vectors.shape[1]) if len(ids) else 0,
+        "dtype": dtype,
+        "metric": metric,
+        "graph_degree": degree,
+        "graph_entry": entry,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "source": source or {},
+    }
+    (tmp_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    if len(ids) > BRUTE_FORCE_MAX:
+        # Recall gate: the graph path is only enabled if it matches the exact scan closely enough
+        snap = VectorSnapshot(tmp_dir)
+        manifest["graph_recall"] = measure_recall(snap)
+        snap.close()
+        (tmp_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    old_dir = out_dir.with_name(out_dir.name + ".old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if out_dir.exists():
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return out_dir
+
+
+def _source_stamp(persist_dir) -> dict:
+    """mtime / size of the Chroma database a snapshot is exported from ({} if there is none)."""
+    db = Path(persist_dir) / "chroma.sqlite3"
+    if not db.exists():
+        return {}
+    st = db.stat()
+    return {"sqlite_mtime": st.st_mtime, "sqlite_size": st.st_size}
+
+
+def export_collection(slug: str, chroma_root=CHROMA_ROOT, snapshot_root=SNAPSHOT_ROOT, dtype: str = "float16") -> Path:
+    """Export one persisted Chroma collection (data/chroma_dbs/<slug>) to a snapshot."""
+    import chromadb  # export-time only; the query path never needs chromadb
+    try:
+        from chromadb.config import Settings
+    except Exception:
+        from chromadb import Settings
+
+    persist_dir = Path(chroma_root) / slug
+    if not persist_dir.exists():
+        raise FileNotFoundError(f"Chroma persist dir not found: {persist_dir}")
+    client = chromadb.Client(Settings(
+        anonymized_telemetry=False,
+        is_persistent=True,
+        persist_directory=str(persist_dir),
+    ))
+    col = client.get_collection(name=slug)
+    data = col.get(include=["embeddings", "documents", "metadatas"])
+    stamp = _source_stamp(persist_dir)
+    return write_snapshot(
+        Path(snapshot_root) / slug,
+        data["ids"], np.asarray(data["embeddings"]), data["documents"], data["metadatas"],
+        dtype=dtype,
+        metric=(col.metadata or {}).get("hnsw:space", DEFAULT_METRIC),
+        source={"collection": slug, "persist_directory": str(persist_dir), "metadata": col.metadata, **stamp},
+    )
+
+
+class VectorSnapshot:
+    """Memory-mapped, read-only view over a snapshot directory."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / "manifest.json").read_text(encoding="utf-8"))
+        self.name = self.manifest.get("source", {}).get("collection", self.path.name)
+        self.metric = self.manifest.get("metric", "cosine")
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        self.sq_norms = np.load(self.path / "sq_norms.npy", mmap_mode="r") if self.metric == "l2" else None
+        self.graph = np.load(self.path / "graph.npy", mmap_mode="r")
+        self.offsets = np.load(self.path / "offsets.npy", mmap_mode="r")
+        self._records_file = open(self.path / "records.jsonl", "rb")
+        size = os.fstat(self._records_file.fileno()).st_size
+        self._records = mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._entry = None
+
+    def __len__(self):
+        return self.manifest["count"]
+
+    def close(self):
+        if isinstance(self._records, mmap.mmap):
+            self._records.close()
+        self._records_file.close()
+
+    def record(self, i: int) -> dict:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return json.loads(self._records[start:end])
+
+    # ---- search -------------------------------------------------------------
+    def _prepare_query(self, query_embedding):
+        """(query vector, its squared norm) in the form the stored vectors expect."""
+        q = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        if self.metric == "cosine":
+            q = _normalise(q)
+        return q, float(q @ q)
+
+    def _dist(self, rows, q: np.ndarray, q_sq: float) -> np.ndarray:
+        """Distances from `q` to the stored vectors selected by `rows` (slice or index array)."""
+        rows_sq = self.sq_norms[rows] if self.sq_norms is not None else None
+        return _distances(self.metric, self.vectors[rows], q, rows_sq, q_sq)
+
+    def _exact(self, q: np.ndarray, k: int, q_sq: float = None):
+        q_sq = float(q @ q) if q_sq is None else q_sq
+        best_idx, best_dist = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for start in range(0, len(self), _BLOCK):
+            dists = self._dist(slice(start, start + _BLOCK), q, q_sq)
+            idx = np.arange(start, start + len(dists))
+            best_idx = np.concatenate([best_idx, idx])
+            best_dist = np.concatenate([best_dist, dists])
+            if len(best_idx) > k:
+                keep = np.argpartition(best_dist, k - 1)[:k]
+                best_idx, best_dist = best_idx[keep], best_dist[keep]
+        order = np.argsort(best_dist)
+        return best_idx[order], best_dist[order]
+
+    def _entry_points(self) -> np.ndarray:
+        """Medoid stored at export time (older snapshots: evenly spread nodes)."""
+        if self._entry is None:
+            if "graph_entry" in self.manifest:
+                self._entry = np.array([self.manifest["graph_entry"]], dtype=np.int64)
+            else:
+                self._entry = np.unique(np.linspace(0, len(self) - 1, num=min(8, len(self))).astype(np.int64))
+        return self._entry
+
+    def _graph_search(self, q: np.ndarray, k: int, ef: int, q_sq: float = None):
+        """Best-first beam search over the graph (HNSW layer-0 style, `ef` results kept)."""
+        q_sq = float(q @ q) if q_sq is None else q_sq
+        ef = max(ef, k)
+        entry = self._entry_points()
+        visited = set(entry.tolist())
+        dists = self._dist(entry, q, q_sq).tolist()
+        candidates = list(zip(dists, entry.tolist()))                   # min-heap by distance
+        heapq.heapify(candidates)
+        results = [(-d, i) for d, i in zip(dists, entry.tolist())]      # max-heap of the best `ef`
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+        while candidates:
+            d, node = heapq.heappop(candidates)
+            if len(results) >= ef and d > -results[0][0]:
+                break
+            nbrs = [j for j in self.graph[node].tolist() if j >= 0 and j not in visited]
+            if not nbrs:
+                continue
+            visited.update(nbrs)
+            for dj, j in zip(self._dist(np.asarray(nbrs), q, q_sq).tolist(), nbrs):
+                if len(results) < ef or dj < -results[0][0]:
+                    heapq.heappush(candidates, (dj, j))
+                    heapq.heappush(results, (-dj, j))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        top = sorted((-nd, i) for nd, i in results)[:k]
+        return np.array([i for _, i in top], dtype=np.int64), np.array([d for d, _ in top], dtype=np.float32)
+
+    def uses_graph(self) -> bool:
+        """Large snapshots whose export-time recall check passed use the graph, others scan exactly."""
+        return len(self) > BRUTE_FORCE_MAX and self.manifest.get("graph_recall", 0.0) >= MIN_GRAPH_RECALL
+
+    def search(self, query_embedding, top_k: int = 6, ef: int = EF_SEARCH):
+        """Return (indices, distances in the snapshot's metric) of the `top_k` nearest records."""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q, q_sq = self._prepare_query(query_embedding)
+        k = min(top_k, len(self))
+        if not self.uses_graph():
+            return self._exact(q, k, q_sq)
+        return self._graph_search(q, k, ef, q_sq)
+
+    def query(self, query_embeddings, n_results: int = 6, include=("documents", "metadatas", "distances")):
+        """Chroma-compatible subset of `Collection.query` (embeddings only)."""
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for emb in query_embeddings:
+            idx, dists = self.search(emb, top_k=n_results)
+            recs = [self.record(int(i)) for i in idx]
+            out["ids"].append([r["id"] for r in recs])
+            out["documents"].append([r["document"] for r in recs])
+            out["metadatas"].append([r["metadata"] for r in recs])
+            out["distances"].append([float(d) for d in dists])
+        return {k: v for k, v in out.items() if k == "ids" or k in include}
+
+
+def measure_recall(snap: VectorSnapshot, n_queries: int = RECALL_QUERIES, k: int = 10, ef: int = EF_SEARCH,
+                   seed: int = 0) -> float:
+    """
+    Mean recall@k of `_graph_search` against `_exact` on probe queries: stored vectors
+    perturbed with noise at 30 % of the per-dimension spread (so they are not exact hits).
+    """
+    n = len(snap)
+    if n == 0:
+        return 1.0
+    rng = np.random.default_rng(seed)
+    k = min(k, n)
+    sample = rng.choice(n, size=min(n_queries, n), replace=False)
+    base = snap.vectors[np.sort(sample)].astype(np.float32)
+    spread = snap.vectors[rng.choice(n, size=min(n, 2000), replace=False)].astype(np.float32).std(axis=0)
+    queries = base + rng.normal(size=base.shape).astype(np.float32) * 0.3 * spread
+    hits = 0
+    for query in queries:
+        q, q_sq = snap._prepare_query(query)
+        exact, _ = snap._exact(q, k, q_sq)
+        approx, _ = snap._graph_search(q, k, ef, q_sq)
+        hits += len(np.intersect1d(exact, approx))
+    return round(hits / (k * len(queries)), 4)
+
+
+def is_stale(snap: VectorSnapshot) -> bool:
+    """True when the source chroma.sqlite3 no longer matches the one the snapshot was exported from."""
+    source = snap.manifest.get("source", {})
+    if "sqlite_mtime" not in source or not source.get("persist_directory"):
+        return False
+    now = _source_stamp(source["persist_directory"])
+    return bool(now) and (now["sqlite_mtime"], now["sqlite_size"]) != (source["sqlite_mtime"], source["sqlite_size"])
+
+
+def open_snapshot(slug: str, snapshot_root=SNAPSHOT_ROOT, allow_stale: bool = False):
+    """Snapshot for `slug`, or None if it has not been exported yet (or is stale, unless `allow_stale`)."""
+    path = Path(snapshot_root) / slug
+    if not (path / "manifest.json").exists():
+        return None
+    snap = VectorSnapshot(path)
+    if not allow_stale and is_stale(snap):
+        logger.warning("Vector snapshot %s is older than its Chroma database (re-ingested?); "
+                       "using Chroma until `python vector_snapshot.py %s` is re-run.", path, slug)
+        snap.close()
+        return None
+    return snap
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export Chroma collections to memory-mapped snapshots.")
+    parser.add_argument("slugs", nargs="*", default=["education", "healthcare", "private_sector", "state"])
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    parser.add_argument("--check-recall", action="store_true",
+                        help="only measure graph recall@10 vs. exact scan on existing snapshots")
+    args = parser.parse_args()
+    for slug in args.slugs:
+        if not args.check_recall:
+            out = export_collection(slug, dtype=args.dtype)
+            print(f"✅ Exported {slug} → {out}")
+        snap = open_snapshot(slug, allow_stale=True)
+        if snap is None:
+            print(f"✗ {slug}: no snapshot")
+            continue
+        mode = "graph" if snap.uses_graph() else "exact scan"
+        if is_stale(snap):
+            mode += " (stale: source changed since export, not used)"
+        print(f"   {slug}: {len(snap)} vectors, metric {snap.metric}, recall@10 {measure_recall(snap):.3f} → {mode}")
+        snap.close()